@@ -1,6 +1,7 @@
 import sys
+import atexit
 import argparse
-import tempfile
+import itertools
 from pathlib import Path
 from src.refactoring.ast_parser import ASTParser
 from src.refactoring.clone_ast_utilities import CloneASTUtilities as CAU
@@ -8,16 +9,21 @@ from src.refactoring.clone_class import CloneClass
 from src.refactoring.clone import Clone
 
 from src.detect_clones.run_clone_detector import RunCloneDetector
+from src.detect_clones.builtin_clone_detector import BuiltinCloneDetector
+from src.detect_clones.sharded_clone_detector import ShardedCloneDetector
+from src.detect_clones.workspace import Workspace
 from src.parse_clone_detection_output.parse_nicad.nicad_parser import NicadParser
-from src.refactoring.file_handler import FileHandler
+from src.parse_clone_detection_output.clone_class_merger import CloneClassMerger
+from src.parse_clone_detection_output.clone_class_table import CloneClassTable
+from src.parse_clone_detection_output.parse_jsonl.jsonl_parser import JsonlParser
+from src.refactoring.file_handler_registry import FileHandlerRegistry
+from src.refactoring.module_analysis import ModuleAnalysis
 from src.detect_clones.parse_init_file import parse_init_file
 
 
 
 
 
-asts_dict = {} # filepath -> ast_base (for said filepath)
-
 def main():
 
     #filepaths = get_filepaths(sys.argv[1:])
@@ -43,36 +49,120 @@ def main():
         RunCloneDetector.consistent_cross_file = True
     if args.log_clone_detection:
         RunCloneDetector.log_clone_detector_run = True
-
-
-    list_of_clone_class_dicts = []
+    if args.extract_tests:
+        RunCloneDetector.extract_tests = True
+    if args.cache_dir:
+        RunCloneDetector.cache_dir = args.cache_dir
+    if args.python_clustering:
+        RunCloneDetector.python_clustering = True
+    if args.memory_budget:
+        ModuleAnalysis.memory_budget = args.memory_budget * 1024 * 1024
+
+
+    #iterables of clone classes, one per path. XML files are parsed lazily, as the clone classes are refactored
+    clone_class_dict_iterables = []
+    #indices of the iterables which are already in the merge order of CloneClassMerger
+    merge_ordered = set()
+
+    #private directory for the tmp filestructures, nicad output, results and logs of this run
+    workspace = Workspace(args.workspace)
+    #also removed if the run ends with an error
+    atexit.register(workspace.remove)
+
+    #config = parse_init_file(path)
+    config = {}
+
+    #nicad is run on all directories up front, concurrently if --jobs is given. Results are returned in the order of the paths
+    nicad_paths = [path for path in paths if path.is_dir() and args.detector == "nicad" and args.shards < 2]
+    job_dirs = [workspace.job_dir(path) for path in nicad_paths]
+    nicad_results = RunCloneDetector.run_all(nicad_paths, job_dirs, config, args.jobs)
+
+    #filepath (resolved) -> number of tests in said file, for experiment results.
+    #keyed on file, so tests of files in overlapping paths are counted once
+    test_counts = {}
+
+    ind = 0 #index of next nicad result
     for path in paths:
-        if path.is_dir():
-            #config = parse_init_file(path)
-            config = {}
-
-            #tmp directory, for copying test files into and running clone detector
-            #will be deleted automatically after 'with' is done
-            with tempfile.TemporaryDirectory() as tmp_path:
-
-                parser_args = RunCloneDetector.run(path, tmp_path, config)
-
-                if args.experiment:
-                    ASTParser.count_tests(tmp_path)
-
-                xml_parser = NicadParser(*parser_args)
-                list_of_clone_class_dicts.extend(xml_parser.parse())
+        if path.is_dir() and args.detector == "builtin":
+            #detect clones in-process, without copying files or running nicad
+            detector = BuiltinCloneDetector(path, cache_dir=args.cache_dir)
+            clone_class_dict_iterables.append(detector.parse())
+
+            if args.experiment:
+                for filepath, cnt in detector.count_tests().items():
+                    test_counts[Path(filepath).resolve()] = cnt
+
+        elif path.is_dir() and args.shards > 1:
+            #nicad is run on each shard of the directory, and clones are joined across shards
+            detector = ShardedCloneDetector(path, args.shards, workspace, config, args.jobs, args.cache_dir)
+            clone_class_dict_iterables.append(detector.parse())
+
+            if args.experiment:
+                for job_dir in detector.job_dirs:
+                    count_tests(path, job_dir, test_counts, args.parse_jobs)
+
+        elif path.is_dir():
+            parser_args, job_dir = nicad_results[ind], job_dirs[ind]
+            ind += 1
+
+            if args.experiment:
+                count_tests(path, job_dir, test_counts, args.parse_jobs)
+
+            xml_parser = NicadParser(*parser_args)
+            clone_class_dict_iterables.append(xml_parser.iter_parse())
+        elif path.suffix == ".jsonl":
+            #clone classes exported by an earlier run
+            jsonl_parser = JsonlParser(path)
+            clone_class_dict_iterables.append(jsonl_parser.iter_parse())
+            if jsonl_parser.merge_order:
+                merge_ordered.add(len(clone_class_dict_iterables) - 1)
         else:
             #xml file
             xml_parser = NicadParser(path)
-            list_of_clone_class_dicts.extend(xml_parser.parse())
+            clone_class_dict_iterables.append(xml_parser.iter_parse())
+
+    #tmp filestructures are removed, results and logs are kept until the XML files have been parsed
+    workspace.cleanup()
     
-    file_handlers = []
-    clone_classes = clone_class_generator(list_of_clone_class_dicts, file_handlers)
+    if len(clone_class_dict_iterables) > 1:
+        #reports can overlap (e.g. nested directories, or XML files from several runs), each clone class is refactored once
+        #each report is read in full and sorted by size first, except exported JSONL files, which are already sorted
+        merger = CloneClassMerger()
+        reports = [iterable if ind in merge_ordered else merger.sort_report(iterable) for ind, iterable in enumerate(clone_class_dict_iterables)]
+        clone_class_dicts = merger.merge(reports)
+    else:
+        merger = None
+        clone_class_dicts = itertools.chain.from_iterable(clone_class_dict_iterables)
+
+    if args.export or args.parse_jobs > 1:
+        #all clone classes are read before refactoring, and kept in a compact table rather than as dicts.
+        #otherwise they are streamed from the parsers one at a time
+        table = CloneClassTable()
+        for clone_class_dict in clone_class_dicts:
+            table.add_class_dict(clone_class_dict)
+        clone_class_dicts = table
+
+    if args.export:
+        JsonlParser.write(table, args.export)
+        print("Clone classes exported to", args.export)
+
+    if args.parse_jobs > 1:
+        #files of all clone classes are parsed up front, in parallel
+        ModuleAnalysis.preload(table.paths, args.parse_jobs)
+
+    file_handlers = FileHandlerRegistry()
+    clone_classes = clone_class_generator(clone_class_dicts, file_handlers)
 
     for clone_class in clone_classes:
         clone_class.refactor_clones()
-        
+        #files whose clones were not refactored can be freed
+        file_handlers.release()
+
+    #all clone classes have been read, the workspace is kept only if given with --workspace
+    workspace.remove()
+    if workspace.root is not None:
+        print("Clone detection results written to", workspace.root)
+
     target_location = Path("refactored_files/check_repo/").resolve()
     if args.dry_run:
         print("Dry run, no files written to.")
@@ -95,51 +185,49 @@ def main():
                 print("refactored file:", file.filepath)
                 print("\t-> " + str(renamed_path))
 
+    if args.verbose and merger is not None:
+        print("Skipped", merger.duplicates, "duplicate clone classes")
     if args.verbose:
         print("Parametrized", CloneClass.tests_parametrized)
         print("in", CloneClass.targets_refactored, "targets")
 
     if args.experiment:
         print("\nExperiment results:")
-        print("Total tests in suite:", ASTParser.tests)
+        tests = sum(test_counts.values())
+        print("Total tests in suite:", tests)
         print("Total clone classes in suite:", CloneClass.cnt - 1) #-1 because value is an ID ready to be assigned to 'next' clone class
         print("Total test clones in suite:", Clone.cnt)
         print("Total tests removed due to parametrization:", CloneClass.tests_parametrized - CloneClass.targets_refactored)
         print("Total clone classes parametrized:", CloneClass.targets_refactored)
         
 
-        print("% of tests removed:", (CloneClass.tests_parametrized - CloneClass.targets_refactored) / ASTParser.tests * 100, "%")
+        print("% of tests removed:", (CloneClass.tests_parametrized - CloneClass.targets_refactored) / tests * 100, "%")
         print("% of clones removed:", CloneClass.tests_parametrized / Clone.cnt * 100, "%")
 
 
 
 
+def count_tests(path, job_dir, test_counts, jobs):
+    """Counts the tests in the original files of the test files in the tmp filestructure of the given job directory,
+    adding the number of tests of each file (by its resolved path) to test_counts.
+    The original files are counted, as with --extract-tests the tmp filestructure only has the extracted test functions."""
+    tmp_path = RunCloneDetector.get_tmp_filestructure_path(job_dir)
+    filepaths = [path / file.relative_to(tmp_path) for file in tmp_path.rglob('*') if file.is_file()]
+    for filepath, cnt in ASTParser.count_tests(filepaths, jobs).items():
+        test_counts[filepath.resolve()] = cnt
+
 def clone_class_generator(clones, file_handlers):
     for clone_class in clones:
 
         ast_clone_nodes = [] 
         #for filepath in clone class
         for filepath, linenumbers in clone_class.items():
-            #get ast_base
-            if filepath not in asts_dict:
-                asts_dict[filepath] = ASTParser.parse_file_to_AST(filepath)
-
-            ast_base = asts_dict[filepath]
-            
-            for handler in file_handlers:
-                if handler.filepath == filepath:
-                    filehandler= handler
-                    break
-            else:
-                #if break not executed in for        
-                filehandler=FileHandler(filepath, ast_base)
-                file_handlers.append(filehandler)
-
+            filehandler = file_handlers.get(filepath)
             
             for lineno in linenumbers:
 
                 #add clone on lineno in filepath to list of clone objects
-                ast_clone_nodes.append(CAU.find_clone_node_in_AST(ast_base, clone_lineno=int(lineno), filehandler=filehandler))
+                ast_clone_nodes.append(CAU.find_clone_node_in_AST(clone_lineno=int(lineno), filehandler=filehandler))
         yield CloneClass(ast_clone_nodes)
 
 #TODO: maybe use with a -f flag for supplying specific files rather than a dir as arg
@@ -161,8 +249,11 @@ def parseargs():
     parser = argparse.ArgumentParser()
     
     parser.add_argument("paths", 
-        action="append", 
-        help="path(s) to check for code clones")
+        nargs="+", 
+        help="""path(s) to check for code clones: directories, nicad XML files or JSONL files written with --export.
+        With several paths, clone classes found in more than one are refactored once.
+        To find them, the clone classes of each path are read and sorted by size before refactoring starts,
+        keeping the (file, line) of every clone in memory. JSONL files are already sorted, and are read as they are refactored.""")
     
     #group
     group = parser.add_mutually_exclusive_group()
@@ -185,6 +276,57 @@ def parseargs():
                         action='store_true', 
                         help="Log clone detector.")
 
+    parser.add_argument("-d", "--detector",
+                        choices=["nicad", "builtin"],
+                        default="nicad",
+                        help="""Clone detector used on directories. 'nicad' runs the nicad6 clone detector in a subprocess.
+                        'builtin' finds type 2 clones between test functions with the ast module, without nicad installed.""")
+
+    parser.add_argument("-c", "--cache-dir",
+                        help="""Directory for caching clone detection results between runs.
+                        With the builtin detector, only test files which have changed since the last run are fingerprinted again.
+                        With nicad, the result for the same test files and config is reused rather than running nicad again.""")
+
+    parser.add_argument("-et", "--extract-tests",
+                        action='store_true', 
+                        help="""Before running nicad, extract only the test functions which can be parametrized from each test file,
+                        so that nicad does not parse and compare helper functions, fixtures, etc.""")
+
+    parser.add_argument("-pc", "--python-clustering",
+                        action='store_true', 
+                        help="""Run nicad without clustering (requires the *_pairs.cfg configs to be installed),
+                        and cluster the clone pairs into clone classes in python instead.""")
+
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=1,
+                        help="""Maximum number of clone detector processes to run at once, when given several directories or --shards.""")
+
+    parser.add_argument("-pj", "--parse-jobs",
+                        type=int,
+                        help="""Number of worker processes used to parse the files with clones before refactoring, and to count tests with --experiment.
+                        Defaults to --jobs.""")
+
+    parser.add_argument("-ws", "--workspace",
+                        help="""Directory in which to create this run's private workspace, for the clone detector's tmp files, results and logs.
+                        Kept after the run, and its path printed. Defaults to the system's tmp directory, where the workspace is removed at the end of the run.""")
+
+    parser.add_argument("-mb", "--memory-budget",
+                        type=int,
+                        help="""Approximate memory (in MB) to use for keeping parsed files.
+                        Over this budget, files without refactored clones are freed, least recently used first, and parsed again if needed.""")
+
+    parser.add_argument("-e", "--export",
+                        help="""Write the detected clone classes to this file, in PyTeRor's JSONL format.
+                        The file can be given as path in later runs, instead of running clone detection again.""")
+
+    parser.add_argument("-s", "--shards",
+                        type=int,
+                        default=1,
+                        help="""Split each directory into this many shards, and run nicad on each shard separately (concurrently with --jobs).
+                        Clones in different shards are found by joining on the fingerprints of the builtin clone detector.
+                        Not used with the builtin detector.""")
+
     parser.add_argument("-dr", "--dry-run",
                         action='store_true', 
                         help="Run the program without writing to file.")
@@ -207,6 +349,8 @@ def parseargs():
 
 
     args = parser.parse_args()
+    if args.parse_jobs is None:
+        args.parse_jobs = args.jobs
     return args
 
 def get_path_obj(args):
@@ -218,8 +362,8 @@ def get_path_obj(args):
         if not path.exists():
             print("Given path does not exist: \n" + str(path))
             sys.exit()
-        elif not (path.is_dir() or path.suffix == ".xml"):
-            print("Given path does not point to a directory or XML file: \n" + str(path))
+        elif not (path.is_dir() or path.suffix == ".xml" or path.suffix == ".jsonl"):
+            print("Given path does not point to a directory, XML file or JSONL file: \n" + str(path))
             sys.exit()
         ret.append(path)
     
@@ -0,0 +1,175 @@
+import ast
+import sys
+import hashlib
+from pathlib import Path
+
+from .run_clone_detector import RunCloneDetector
+from .fingerprint_index import FingerprintIndex
+from ..refactoring.ast_parser import ASTParser
+from ..refactoring.clone_ast_utilities import CloneASTUtilities
+
+
+class BuiltinCloneDetector:
+    """Finds type 2 clones between test functions directly from the 'ast' module,
+    as an alternative to running the Nicad clone detector in a subprocess.
+
+    Each test function is normalized (identifiers renamed, literals abstracted, docstring and decorators dropped),
+    and the functions are then grouped on a hash of their normalized form.
+    After detecting, the result is a list of clones in the same format as NicadParser.parse:
+
+    list of clone classes (matching clones), each clone class is a dict
+    DICT: from path to int, (absolute, not relative) filepath object to a list of linenumbers specifying start of clone
+    """
+
+    #fields which are never part of the normalized form of a node
+    ignored_fields = ("ctx", "kind", "type_comment")
+    #version of the normalized form (see normalize), to be increased whenever normalize or fingerprint changes
+    normalizer_version = 1
+
+    def __init__(self, path: str | Path, consistent: bool = None, cache_dir: str | Path = None) -> None:
+        self.path = Path(path).resolve()
+        #same choice of renaming as the nicad configs: blind (type2_abstracted) or consistent (type2_consistent_abstracted)
+        if consistent is None:
+            consistent = RunCloneDetector.consistent_cross_file
+        self.consistent = consistent
+        self.index = None
+        if cache_dir is not None:
+            self.index = FingerprintIndex(cache_dir, self.consistent, self.get_normalizer())
+        self.test_counts = {} #filepath -> number of tests in said filepath
+
+    def parse(self):
+        """Detects clones between the test functions of all test files in the directory provided in the construction of the object.
+        Returns:
+
+        list of clone classes (matching clones),
+        each clone class represented by a dict from path to int:
+        (absolute) filepath object to a list of linenumbers specifying start of clone
+        """
+        assert self.path.exists(), "Path does not exist: " + str(self.path)
+        assert self.path.is_dir(), "Path does not lead to a directory: " + str(self.path)
+
+        fingerprint_to_clones = {} #fingerprint -> list of (filepath, lineno)
+        for filepath in self.get_test_files():
+            #only files which have changed since the last run are parsed and fingerprinted
+            entry = self.index.get(filepath) if self.index is not None else None
+            if entry is not None:
+                functions, tests = entry["functions"], entry["tests"]
+            else:
+                functions, tests = self.fingerprint_file(filepath)
+                if self.index is not None:
+                    self.index.update(filepath, functions, tests)
+            self.test_counts[filepath] = tests
+
+            for lineno, fingerprint in functions:
+                fingerprint_to_clones.setdefault(fingerprint, []).append((filepath, lineno))
+
+        if self.index is not None:
+            self.index.prune(self.path, {str(filepath) for filepath in self.test_counts})
+            self.index.save()
+
+        clone_classes_list = []
+        for clones in fingerprint_to_clones.values():
+            if len(clones) < 2:
+                continue
+            class_dict = {}
+            for filepath, lineno in clones:
+                class_dict.setdefault(filepath, []).append(lineno)
+            clone_classes_list.append(class_dict)
+
+        return clone_classes_list
+
+    def get_test_files(self):
+        """Returns a sorted list of all files in the directory which adhere to pytests test discovery rules."""
+        return sorted(RunCloneDetector.find_test_files(self.path))
+
+    def count_tests(self) -> dict:
+        """Returns a dict from filepath to number of tests in said filepath, for the files checked during detection."""
+        return dict(self.test_counts)
+
+    def get_normalizer(self) -> str:
+        """Returns a description of everything the fingerprints depend on, apart from the files themselves:
+        the version of the normalized form, the renaming, the ignored fields and the python version (which decides the fields of the AST nodes)."""
+        renaming = "consistent" if self.consistent else "blind"
+        python_version = str(sys.version_info[0]) + "." + str(sys.version_info[1])
+        return " ".join(["v" + str(BuiltinCloneDetector.normalizer_version), renaming, ",".join(BuiltinCloneDetector.ignored_fields), "python" + python_version])
+
+    def fingerprint_file(self, filepath: Path):
+        """Parses the given file, returning a tuple of:
+            - a list of (lineno, fingerprint) for each test function in the file
+            - the number of tests in the file
+        """
+        ast_base = ASTParser.parse_file_to_AST(filepath)
+        if type(ast_base) != ast.Module:
+            #file could not be parsed
+            return [], 0
+        return list(self.fingerprint_module(ast_base)), CloneASTUtilities.count_tests(ast_base)
+
+    def fingerprint_module(self, ast_base):
+        """For every test function in the global scope or directly inside a class of the given module,
+        yields a list of the line number of the function definition and the fingerprint of the function (as stored in the FingerprintIndex)."""
+        for node in ast_base.body:
+            if isinstance(node, ast.FunctionDef) and BuiltinCloneDetector.is_test_function(node):
+                yield [node.lineno, self.fingerprint(node)]
+            elif isinstance(node, ast.ClassDef):
+                for class_node in node.body:
+                    if isinstance(class_node, ast.FunctionDef) and BuiltinCloneDetector.is_test_function(class_node):
+                        yield [class_node.lineno, self.fingerprint(class_node)]
+
+    def is_test_function(funcdef):
+        return funcdef.name[:5] == "test_"
+
+    def fingerprint(self, funcdef) -> str:
+        """Returns a hash of the normalized form of the given function definition.
+        Two functions with the same fingerprint are type 2 clones of each other."""
+        tokens = []
+        identifiers = {}
+        body = funcdef.body
+        if (type(body[0]) == ast.Expr and type(body[0].value) == ast.Constant and type(body[0].value.value) == str):
+            #docstring
+            body = body[1:]
+
+        #name and decorators of the function itself are left out
+        self.normalize(funcdef.args, tokens, identifiers)
+        for stmt in body:
+            self.normalize(stmt, tokens, identifiers)
+        if funcdef.returns is not None:
+            self.normalize(funcdef.returns, tokens, identifiers)
+
+        return hashlib.sha1(" ".join(tokens).encode()).hexdigest()
+
+    def normalize(self, node, tokens: list, identifiers: dict):
+        """Appends the normalized form of the given node to the list tokens.
+        Literals are abstracted, and identifiers are renamed either blindly (all the same),
+        or consistently (same identifier, same name)."""
+        tokens.append(type(node).__name__)
+        tokens.append("(")
+        if type(node) == ast.Constant:
+            tokens.append("literal")
+        else:
+            for field, value in ast.iter_fields(node):
+                if field in BuiltinCloneDetector.ignored_fields:
+                    continue
+                elif isinstance(value, ast.AST):
+                    self.normalize(value, tokens, identifiers)
+                elif isinstance(value, list):
+                    tokens.append("[")
+                    for elem in value:
+                        if isinstance(elem, ast.AST):
+                            self.normalize(elem, tokens, identifiers)
+                        else:
+                            #list of identifiers, e.g. in global statement
+                            tokens.append(self.rename(elem, identifiers))
+                    tokens.append("]")
+                elif isinstance(value, str):
+                    tokens.append(self.rename(value, identifiers))
+                else:
+                    #None, or ints such as ImportFrom.level
+                    tokens.append(str(value))
+        tokens.append(")")
+
+    def rename(self, identifier: str, identifiers: dict) -> str:
+        if not self.consistent:
+            return "x"
+        if identifier not in identifiers:
+            identifiers[identifier] = "x" + str(len(identifiers))
+        return identifiers[identifier]
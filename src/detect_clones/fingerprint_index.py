@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+
+
+class FingerprintIndex:
+    """Persistent on-disk index used by the builtin clone detector, so that only changed files are fingerprinted again on a rerun.
+
+    For each test file the index stores:
+        - its size and modification time, for quickly checking that the file is unchanged
+        - a hash of its contents, for when the modification time has changed but the contents have not
+        - the line number and fingerprint of each of its test functions, as well as its number of tests
+
+    The header of the index stores the format version of the index, and a description of the normalizer which computed the fingerprints
+    (see BuiltinCloneDetector.get_normalizer). If either differs, the whole index is discarded, as its fingerprints can not be compared with new ones.
+    """
+    version = 1
+
+    def __init__(self, cache_dir: str | Path, consistent: bool = False, normalizer: str = None) -> None:
+        """Parameters:
+            - cache_dir - directory of the index file
+            - consistent - whether identifiers are renamed consistently or blindly
+            - normalizer - description of the normalizer computing the fingerprints, the index is discarded if it was stored with another one
+        """
+        self.cache_dir = Path(cache_dir)
+        #fingerprints depend on the renaming used, so we keep one index per kind of renaming
+        renaming = "consistent" if consistent else "blind"
+        self.index_path = self.cache_dir / Path("fingerprints_" + renaming + ".json")
+        self.normalizer = normalizer
+        self.files = {} #str filepath -> entry for said filepath
+        self.changed = False
+        self.load()
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        with open(self.index_path) as f:
+            try:
+                index = json.load(f)
+            except json.JSONDecodeError:
+                #corrupt index, everything is fingerprinted again
+                return
+        if index.get("version") == FingerprintIndex.version and index.get("normalizer") == self.normalizer:
+            self.files = index["files"]
+
+    def save(self):
+        """Writes the index to disk, if it has changed since it was loaded.
+        Written to a temporary file first, so that a concurrent run never reads a half-written index."""
+        if not self.changed:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": FingerprintIndex.version, "normalizer": self.normalizer, "files": self.files}, f)
+        os.replace(tmp_path, self.index_path)
+        self.changed = False
+
+    def get(self, filepath: Path):
+        """Returns the stored entry for the given file if the file is unchanged since it was stored, else None."""
+        entry = self.files.get(str(filepath))
+        if entry is None:
+            return None
+        stat = filepath.stat()
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+
+        #touched, but possibly not changed
+        if entry["sha1"] != FingerprintIndex.hash_file(filepath):
+            return None
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        self.changed = True
+        return entry
+
+    def update(self, filepath: Path, functions: list, tests: int):
+        """Stores the fingerprints (list of (lineno, fingerprint)) and number of tests of the given file."""
+        stat = filepath.stat()
+        self.files[str(filepath)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": FingerprintIndex.hash_file(filepath),
+            "tests": tests,
+            "functions": functions}
+        self.changed = True
+
+    def prune(self, root: Path, seen: set):
+        """Removes the entries of files under the given root directory which were not seen during the last detection,
+        i.e. deleted files or files which are no longer test files."""
+        root = str(root) + os.sep
+        for filepath in [filepath for filepath in self.files if filepath.startswith(root) and filepath not in seen]:
+            del self.files[filepath]
+            self.changed = True
+
+    def hash_file(filepath: Path) -> str:
+        with open(filepath, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
@@ -0,0 +1,78 @@
+import ast
+import fnmatch
+from pathlib import Path
+
+from ..refactoring.ast_parser import ASTParser
+from ..refactoring.decorator_checker import DecoratorChecker
+
+
+class FunctionExtractor:
+    """Extracts the test functions which can be parametrized from a test file, so that the clone detector only compares those.
+    Helper functions, fixtures and functions in classes not collected by pytest would be disregarded by CloneClass anyway.
+
+    The extracted file keeps the source lines of each test function as they are (including decorators),
+    and classes are reduced to a 'class Test...:' line followed by their test methods.
+    Since the extracted lines are moved, a line number map is kept, from each line in the extracted file to the line in the original file.
+    """
+
+    def extract(filepath: Path):
+        """Extracts the test functions in the file at the given path.
+
+        Returns:
+            Tuple of a list of lines (the extracted file) and a list of original line numbers (one for each extracted line).
+            If the file can not be parsed, returns None.
+        """
+        ast_base = ASTParser.parse_file_to_AST(filepath)
+        if type(ast_base) != ast.Module:
+            return None
+        with open(filepath) as f:
+            lines = f.readlines()
+
+        extracted_lines = []
+        lineno_map = []
+        for node in ast_base.body:
+            if isinstance(node, ast.FunctionDef) and FunctionExtractor.is_test(node):
+                FunctionExtractor.add_function(node, lines, extracted_lines, lineno_map)
+
+            elif isinstance(node, ast.ClassDef) and fnmatch.fnmatch(node.name, 'Test*'):
+                test_methods = [class_node for class_node in node.body if isinstance(class_node, ast.FunctionDef) and FunctionExtractor.is_test(class_node)]
+                if test_methods == []:
+                    continue
+                extracted_lines.append("class " + node.name + ":\n")
+                lineno_map.append(node.lineno)
+                for method in test_methods:
+                    FunctionExtractor.add_function(method, lines, extracted_lines, lineno_map)
+
+        return extracted_lines, lineno_map
+
+    def is_test(funcdef) -> bool:
+        """Same criteria as Clone.is_test and Clone.is_fixture"""
+        if not fnmatch.fnmatch(funcdef.name, 'test_*'):
+            return False
+        return not any(DecoratorChecker.is_fixture_decorator(decorator) for decorator in funcdef.decorator_list)
+
+    def add_function(funcdef, lines, extracted_lines, lineno_map):
+        """Adds the lines of the given function, from its first decorator to the end of its body, to extracted_lines."""
+        first = min([funcdef.lineno] + [decorator.lineno for decorator in funcdef.decorator_list])
+        for lineno in range(first, funcdef.end_lineno + 1):
+            line = lines[lineno - 1]
+            if not line.endswith("\n"):
+                line += "\n"
+            extracted_lines.append(line)
+            lineno_map.append(lineno)
+
+    def stage_extracted(filepath: Path, staged_filepath: Path):
+        """Writes the extracted test functions of the file at filepath to staged_filepath.
+
+        Returns:
+            The line number map of the extracted file, or None if the file could not be extracted (nothing is written).
+        """
+        extracted = FunctionExtractor.extract(filepath)
+        if extracted is None:
+            return None
+        extracted_lines, lineno_map = extracted
+
+        staged_filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(staged_filepath, "w") as f:
+            f.writelines(extracted_lines)
+        return lineno_map
@@ -0,0 +1,50 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+
+class NicadResultCache:
+    """Content-addressed cache of the XML files outputted by nicad.
+
+    Results are stored under a digest of the staged test files (relative paths and contents) and the nicad config used,
+    so an unchanged set of test files never has to be run through nicad twice.
+    As the tmp filestructure is in a new location on each run, its path in the cached XML is replaced with a placeholder,
+    which is used as the tmp filepath when parsing the cached XML (see NicadParser.convert_path).
+    """
+    version = 1
+    placeholder = "pyteror_staged_test_files"
+
+    def __init__(self, cache_dir: str | Path) -> None:
+        self.cache_dir = Path(cache_dir) / Path("nicad")
+
+    def digest(self, staged_path: Path, config_name: str) -> str:
+        """Returns the digest of the test files staged in the given directory, and the given nicad config."""
+        digest = hashlib.sha256()
+        digest.update(("v" + str(NicadResultCache.version) + "\0" + config_name + "\0").encode())
+        for filepath in sorted(file for file in staged_path.rglob('*') if file.is_file()):
+            digest.update(str(filepath.relative_to(staged_path)).encode() + b"\0")
+            with open(filepath, "rb") as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+        return digest.hexdigest()
+
+    def get(self, digest: str):
+        """Returns the path of the cached XML file for the given digest, or None if there is none."""
+        xml_path = self.cache_dir / Path(digest + ".xml")
+        if xml_path.exists():
+            return xml_path
+        return None
+
+    def store(self, digest: str, xml_path: Path, staged_path: Path):
+        """Stores the XML file at xml_path under the given digest, replacing the path of the tmp filestructure it was run on with the placeholder.
+        Written to a temporary file first, so that a concurrent run never reads a half-written XML file."""
+        with open(xml_path) as f:
+            xml = f.read()
+        xml = xml.replace(escape(str(staged_path), {'"': "&quot;"}), NicadResultCache.placeholder)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(xml)
+        os.replace(tmp_path, self.cache_dir / Path(digest + ".xml"))
@@ -1,12 +1,16 @@
 import sys
 import os
-import subprocess
+import errno
+import asyncio
 import datetime
 
 import shutil
 
 from pathlib import Path
 
+from .function_extractor import FunctionExtractor
+from .nicad_result_cache import NicadResultCache
+
 #remove files which aren't test_*py or *_test.py 
 # run nicad on remaining files to see if code clones in tests of repo
 # TODO: also check potential pytest.ini file(or hidden .pytest.ini) 
@@ -17,17 +21,68 @@ class RunCloneDetector:
 
     consistent_cross_file = False
     log_clone_detector_run = False
-    def run(path, tmp_dir_path, config):
+    extract_tests = False
+    cache_dir = None #if set, nicad results are cached here (see NicadResultCache)
+    python_clustering = False
+    def run(path, job_dir, config):
+        """Runs the clone detector on the test files in the directory at the given path.
+        All files of the run are written to the given job directory (see Workspace).
+        Returns the arguments for a NicadParser of the result."""
+        return RunCloneDetector.run_all([path], [job_dir], config)[0]
+
+    def run_all(paths, job_dirs, config, jobs = 1, filepaths_lists = None):
+        """Runs the clone detector on each of the given directories, with at most 'jobs' clone detector processes running at once.
+        Each directory is staged, detected and logged in its own job directory (at the same index in job_dirs).
+        If filepaths_lists is given, only the test files in the list at the same index are staged for each directory.
+        Returns a list of arguments for a NicadParser, in the same order as the given paths."""
+        if 'fileglob' in config.keys():
+            RunCloneDetector.fileglob = config['fileglob']
+        if filepaths_lists is None:
+            filepaths_lists = [None] * len(paths)
+
+        async def run_jobs():
+            semaphore = asyncio.Semaphore(max(jobs, 1))
+            return await asyncio.gather(*[RunCloneDetector.run_async(path, job_dir, semaphore, filepaths) for path, job_dir, filepaths in zip(paths, job_dirs, filepaths_lists)])
+
+        return asyncio.run(run_jobs())
+
+    async def run_async(path, job_dir, semaphore, filepaths = None):
+        """Stages the test files of the directory at the given path and runs the clone detector on them as a subprocess,
+        once the semaphore allows it."""
         orig_path = path
+        job_dir = Path(job_dir)
+        async with semaphore:
+            #staging is blocking file I/O, done in a thread so other clone detector processes can be awaited meanwhile
+            path, lineno_maps = await asyncio.to_thread(RunCloneDetector.create_tmp_filestructure, path, job_dir, filepaths)
 
-        orig_dir_name = str(path.name)
+            command, cp_from_path = RunCloneDetector.get_command(path)
 
-        path = RunCloneDetector.create_tmp_filestructure(path, tmp_dir_path)
-        
-        if 'fileglob' in config.keys():
-            RunCloneDetector.fileglob = config['fileglob']
+            if RunCloneDetector.cache_dir is not None:
+                cache = NicadResultCache(RunCloneDetector.cache_dir)
+                digest = await asyncio.to_thread(cache.digest, path, command[-1])
+                cached_xml_file = cache.get(digest)
+                if cached_xml_file is not None:
+                    #same test files already run through nicad with the same config
+                    return (cached_xml_file, orig_path, NicadResultCache.placeholder, lineno_maps)
+
+            process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await process.communicate()
+
+        RunCloneDetector.check_output(stdout.decode(), stderr.decode(), job_dir)
+
+        if not cp_from_path.exists():
+            raise FileNotFoundError("Path does not exist: " + str(cp_from_path))
+        #copied out of nicad's output directory, which is removed when the workspace is cleaned up
+        clones_xml_file = job_dir / Path("clone_classes.xml")
+        shutil.copyfile(cp_from_path, clones_xml_file)
+        if RunCloneDetector.cache_dir is not None:
+            cache.store(digest, clones_xml_file, path)
+
+        return (clones_xml_file, orig_path, path, lineno_maps)
 
-        cwd = os.getcwd()
+    def get_command(path):
+        """Returns the command for running nicad on the tmp filestructure at the given path,
+        and the path of the XML file nicad outputs the clone classes to."""
         #run nicad clone detector on tmp filestructure to find clones in test files
         #UNSAFE: os.system("nicad6 functions py " + str(path) + "/ type2_abstracted")
         #TODO: use config in this repo, instead of at nicad install location
@@ -39,16 +94,20 @@ class RunCloneDetector:
             command = ["nicad6", "functions", "py", str(path) + "/", "type2_abstracted"]
             cp_from_path = Path(str(path) + "_functions-blind-abstract-clones/tmp_subfolder_functions-blind-abstract-clones-0.00-classes.xml")
 
+        if RunCloneDetector.python_clustering:
+            #config without nicad's clustering. Nicad outputs clone pairs, which NicadParser clusters into classes
+            command[-1] += "_pairs"
+            cp_from_path = cp_from_path.with_name(cp_from_path.name.replace("-classes.xml", ".xml"))
+        return command, cp_from_path
 
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-
-        error = "*** ERROR" in result.stdout.decode()
+    def check_output(stdout, stderr, job_dir):
+        """Logs the output of the clone detector to the job directory if logging is enabled, or if it failed. Exits if it failed."""
+        error = "*** ERROR" in stdout
         if RunCloneDetector.log_clone_detector_run or error:
-            filename = "nicad" + str(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".log")
+            filename = job_dir / Path("nicad" + str(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".log"))
             with open(filename, "a+") as f:
-                f.write(result.stdout.decode())
-                f.write(result.stderr.decode())
+                f.write(stdout)
+                f.write(stderr)
             print(f"Clone detection logged in {filename}")
 
         if error:
@@ -56,49 +115,77 @@ class RunCloneDetector:
             sys.exit()
 
 
-        target_xml_path = ""
-        clones_xml_file = "clone_classes.xml"
-        if not cp_from_path.exists():
-            raise FileNotFoundError("Path does not exist: " + str(cp_from_path))
-        command = ["cp", str(cp_from_path), str(clones_xml_file)]
-        subprocess.run(command, check=True)
-
-        return (clones_xml_file, orig_path, path)
 
-
-
-    def create_tmp_filestructure(path, tmp_dir_path):
-        """Copies the directory structure at the given path into the current working directory,
-        Also copies over all files which adhere to pytests test discovery rules
+    def create_tmp_filestructure(path, tmp_dir_path, filepaths = None):
+        """Mirrors the directory structure at the given path into the given tmp directory,
+        including only files which adhere to pytests test discovery rules.
+        Files are hardlinked rather than copied, see RunCloneDetector.stage_test_files.
+        Returns the path of the mirror, and the line number maps of extracted files (see FunctionExtractor).
         TODO: include specific rules for this repo, set up in pytest.ini, or similar file (.toml, etc.)"""
         
         #problems with these two options: first creates regular directory. Second creates directory in tmp/, but has to be deleted by user
         #tmp_dir_path = Path(os.getcwd() + "/"+ str(path.name) + "_temp_filestructure").mkdtemp
         #tmp_dir_path = tempfile.mkdtemp()
         
-        #therefore we use tmp_dir_path supplied from caller on run function. Should be created in context manager ("with ... as ...:")
-        tmp_dir_path = tmp_dir_path / Path("tmp_subfolder")
-        try:
-            shutil.copytree(str(path), str(tmp_dir_path), ignore=RunCloneDetector.ignore_non_test_py_files)
-        except FileExistsError:
-            print("This error should not occur... remove tmp directory?")
-            sys.exit()
-        except shutil.Error: #permissions thing
-            pass
-        return tmp_dir_path
-
-
-    #copytree will only copy test files and directories
-    def ignore_non_test_py_files(direc, files):
-        pdir = Path(direc)
-        ignore_files = []
-        for file in files:
-            
-            filepath = Path(direc + "/" + file)
-            if filepath.match("*/test_*.py") or filepath.match("*_test.py") or filepath.is_dir():
-                pass
-            elif any(filepath.match("*/" + glob) for glob in RunCloneDetector.fileglob):
+        #therefore we use tmp_dir_path supplied from caller on run function, a job directory in the run's Workspace.
+        tmp_dir_path = RunCloneDetector.get_tmp_filestructure_path(tmp_dir_path)
+        lineno_maps = RunCloneDetector.stage_test_files(path, tmp_dir_path, filepaths)
+        return tmp_dir_path, lineno_maps
+
+    def get_tmp_filestructure_path(job_dir):
+        """Returns the path of the tmp filestructure in the given job directory."""
+        return Path(job_dir) / Path("tmp_subfolder")
+
+    def stage_test_files(path, staging_path, filepaths = None):
+        """Mirrors the test files in the directory at path into the new directory at staging_path (in the run's job directory).
+        Each test file is hardlinked into the mirror, and only copied if a hardlink is not possible (e.g. across filesystems).
+        If filepaths is given, only these test files (in the directory at path) are mirrored.
+
+        If RunCloneDetector.extract_tests is set, only the test functions of each file are written to the mirror (see FunctionExtractor).
+        Returns a dict from the path of each extracted file (relative to the mirror) to its line number map."""
+        path = Path(path)
+        staging_path = Path(staging_path)
+
+        if filepaths is None:
+            filepaths = RunCloneDetector.find_test_files(path)
+
+        lineno_maps = {}
+        for filepath in filepaths:
+            staged_filepath = staging_path / filepath.relative_to(path)
+            try:
+                lineno_map = None
+                if RunCloneDetector.extract_tests:
+                    lineno_map = FunctionExtractor.stage_extracted(filepath, staged_filepath)
+                if lineno_map is None:
+                    RunCloneDetector.stage_file(filepath, staged_filepath)
+                else:
+                    lineno_maps[str(filepath.relative_to(path))] = lineno_map
+            except PermissionError: #permissions thing, file is skipped
                 pass
-            else:             
-                ignore_files.append(file)
-        return ignore_files
+        return lineno_maps
+
+    def find_test_files(path):
+        """Yields the path of every file in the directory at path (including subdirectories) which is a test file."""
+        for dirpath, dirnames, filenames in os.walk(path, followlinks=True):
+            for filename in filenames:
+                filepath = Path(dirpath) / filename
+                if RunCloneDetector.is_test_file(filepath):
+                    yield filepath
+
+    def stage_file(filepath, staged_filepath):
+        """Hardlinks the file at filepath to staged_filepath, falling back to copying the file."""
+        staged_filepath.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(filepath, staged_filepath)
+        except OSError as e:
+            #different filesystems, filesystem without hardlinks, or too many links to the file
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(filepath, staged_filepath)
+
+    def is_test_file(filepath: Path) -> bool:
+        """Checks whether the given file adheres to pytests test discovery rules (test_*.py or *_test.py),
+        or to one of the globs in RunCloneDetector.fileglob"""
+        if filepath.match("*/test_*.py") or filepath.match("*_test.py"):
+            return True
+        return any(filepath.match("*/" + glob) for glob in RunCloneDetector.fileglob)
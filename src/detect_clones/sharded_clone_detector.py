@@ -0,0 +1,93 @@
+from pathlib import Path
+
+from .run_clone_detector import RunCloneDetector
+from .builtin_clone_detector import BuiltinCloneDetector
+from ..parse_clone_detection_output.parse_nicad.nicad_parser import NicadParser
+from ..parse_clone_detection_output.union_find import UnionFind
+from ..parse_clone_detection_output.clone_class_table import CloneClassTable
+
+
+class ShardedCloneDetector:
+    """Runs nicad on a directory split into shards, rather than on the whole directory at once.
+    As nicad compares every pair of functions it is given, several smaller runs (which can run concurrently) are cheaper than one large run.
+
+    Clones in different shards are never compared by nicad. These are instead found through a join on the fingerprints
+    of the builtin clone detector: functions with the same fingerprint in different shards are merged into the same clone class,
+    along with the rest of the clone classes nicad found them in.
+
+    After detecting, the result is a CloneClassTable, which yields clone classes in the same format as NicadParser.parse.
+    """
+
+    def __init__(self, path: str | Path, n_shards: int, workspace, config: dict, jobs: int = 1, cache_dir: str | Path = None) -> None:
+        self.path = Path(path).resolve()
+        self.n_shards = n_shards
+        self.workspace = workspace
+        self.config = config
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        self.job_dirs = []
+
+    def get_shards(self):
+        """Splits the test files of the directory into n_shards lists of about equal total file size.
+        Files are kept in sorted order, so that files in the same directory tend to end up in the same shard."""
+        filepaths = sorted(RunCloneDetector.find_test_files(self.path))
+        sizes = [filepath.stat().st_size for filepath in filepaths]
+        shard_size = sum(sizes) / self.n_shards
+
+        shards = [[]]
+        current_size = 0
+        for filepath, size in zip(filepaths, sizes):
+            if current_size >= shard_size and len(shards) < self.n_shards:
+                shards.append([])
+                current_size = 0
+            shards[-1].append(filepath)
+            current_size += size
+        return [shard for shard in shards if shard != []]
+
+    def parse(self):
+        """Runs nicad on each shard, and joins the resulting clone classes across shards.
+        Returns:
+
+        CloneClassTable of the joined clone classes. Iterating over it yields each clone class as a dict from path to int:
+        (absolute) filepath object to a list of linenumbers specifying start of clone
+        """
+        shards = self.get_shards()
+        self.job_dirs = [self.workspace.job_dir(self.path) for _ in shards]
+        results = RunCloneDetector.run_all([self.path] * len(shards), self.job_dirs, self.config, self.jobs, shards)
+
+        #all shards are parsed into one table, so that each file has one file ID
+        table = CloneClassTable()
+        for parser_args in results:
+            NicadParser(*parser_args).parse_table(table)
+
+        clones = UnionFind() #of (file ID, start line)
+        endlines = {} #(file ID, start line) -> end line, of the clones found by nicad
+        for rows in table.iter_class_rows():
+            first = (table.file_ids[rows[0]], table.startlines[rows[0]])
+            for row in rows:
+                clone = (table.file_ids[row], table.startlines[row])
+                clones.union(first, clone)
+                endlines[clone] = table.endlines[row]
+
+        #join on fingerprints: only clone classes spanning more than one shard add anything to nicad's results
+        shard_of_file = {}
+        for ind in range(len(shards)):
+            for filepath in shards[ind]:
+                shard_of_file[filepath] = ind
+        consistent = RunCloneDetector.consistent_cross_file
+        for fingerprint_class in BuiltinCloneDetector(self.path, consistent, self.cache_dir).parse():
+            if len({shard_of_file[filepath] for filepath in fingerprint_class}) < 2:
+                continue
+            members = [(table.get_file_id(filepath), lineno) for filepath, linenumbers in fingerprint_class.items() for lineno in linenumbers]
+            for member in members:
+                clones.union(members[0], member)
+
+        joined_table = CloneClassTable()
+        joined_table.paths = table.paths
+        joined_table.path_ids = table.path_ids
+        for group in clones.groups():
+            if len(group) < 2:
+                continue
+            #clones only found by the fingerprint join have an unknown end line (0)
+            joined_table.add_class((file_id, startline, endlines.get((file_id, startline), 0)) for file_id, startline in group)
+        return joined_table
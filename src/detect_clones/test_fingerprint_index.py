@@ -0,0 +1,30 @@
+from fingerprint_index import FingerprintIndex
+
+
+def stored_index(tmp_path, normalizer):
+    filepath = tmp_path / "test_a.py"
+    filepath.write_text("def test_a():\n    assert 1\n")
+    index = FingerprintIndex(tmp_path / "cache", normalizer=normalizer)
+    index.update(filepath, [[1, "fingerprint"]], 1)
+    index.save()
+    return filepath
+
+
+def test_reloads_unchanged_files(tmp_path):
+    filepath = stored_index(tmp_path, "v1 blind")
+    index = FingerprintIndex(tmp_path / "cache", normalizer="v1 blind")
+    assert index.get(filepath)["functions"] == [[1, "fingerprint"]]
+
+
+def test_discarded_on_other_normalizer(tmp_path):
+    filepath = stored_index(tmp_path, "v1 blind")
+    index = FingerprintIndex(tmp_path / "cache", normalizer="v2 blind")
+    assert index.get(filepath) is None
+    assert index.files == {}
+
+
+def test_changed_file(tmp_path):
+    filepath = stored_index(tmp_path, "v1 blind")
+    filepath.write_text("def test_a():\n    assert 22\n")
+    index = FingerprintIndex(tmp_path / "cache", normalizer="v1 blind")
+    assert index.get(filepath) is None
@@ -0,0 +1,66 @@
+import shutil
+from xml.sax.saxutils import quoteattr
+from src.detect_clones.nicad_result_cache import NicadResultCache
+from src.parse_clone_detection_output.parse_nicad.nicad_parser import NicadParser
+
+#run from the repository root (python -m pytest), as the modules are imported through src
+
+
+def write_test_files(path):
+    (path / "sub dir").mkdir(parents=True)
+    (path / "sub dir" / "test_a&b.py").write_text("def test_a():\n    assert 1\n\ndef test_b():\n    assert 2\n")
+    (path / "test_c.py").write_text("def test_c():\n    assert 3\n")
+
+
+def write_xml(xml_path, staged_path, classes):
+    """Writes a nicad XML file of the given clone classes, lists of (path relative to staged_path, start line, end line)."""
+    lines = ["<clones>"]
+    for clones in classes:
+        lines.append('<class nclones="' + str(len(clones)) + '">')
+        for file, startline, endline in clones:
+            lines.append('<source file=' + quoteattr(str(staged_path / file)) + ' startline="' + str(startline) + '" endline="' + str(endline) + '"></source>')
+        lines.append("</class>")
+    lines.append("</clones>")
+    xml_path.write_text("\n".join(lines))
+
+
+def test_cache_hit_maps_to_original_paths(tmp_path):
+    orig_path = tmp_path / "orig"
+    #job directories are named after the directory, which is escaped in the XML
+    staged_path = tmp_path / "0_tests & more" / "tmp_subfolder"
+    write_test_files(orig_path)
+    shutil.copytree(orig_path, staged_path)
+    #test_c.py is extracted: line 1 of the staged file is line 5 of the original
+    lineno_maps = {"test_c.py": [5, 6]}
+    xml_path = staged_path.parent / "clone_classes.xml"
+    write_xml(xml_path, staged_path, [[("sub dir/test_a&b.py", 1, 2), ("sub dir/test_a&b.py", 4, 5), ("test_c.py", 1, 2)]])
+    fresh = NicadParser(xml_path, orig_path, staged_path, lineno_maps).parse()
+
+    cache = NicadResultCache(tmp_path / "cache")
+    digest = cache.digest(staged_path, "type2_abstracted")
+    assert cache.get(digest) is None
+    cache.store(digest, xml_path, staged_path)
+    cached_xml_path = cache.get(digest)
+    assert str(staged_path) not in cached_xml_path.read_text()
+
+    #the next run stages the same files in another job directory
+    next_staged_path = tmp_path / "next_job" / "tmp_subfolder"
+    shutil.copytree(orig_path, next_staged_path)
+    assert cache.get(cache.digest(next_staged_path, "type2_abstracted")) == cached_xml_path
+    hit = NicadParser(cached_xml_path, orig_path, NicadResultCache.placeholder, lineno_maps).parse()
+
+    assert hit == fresh
+    assert hit == [{orig_path / "sub dir" / "test_a&b.py": [1, 4], orig_path / "test_c.py": [5]}]
+
+
+def test_digest_changes_with_files_and_config(tmp_path):
+    staged_path = tmp_path / "staged"
+    write_test_files(staged_path)
+    cache = NicadResultCache(tmp_path / "cache")
+    digest = cache.digest(staged_path, "type2_abstracted")
+
+    assert cache.digest(staged_path, "type2_consistent_abstracted") != digest
+    (staged_path / "test_c.py").write_text("def test_c():\n    assert 4\n")
+    assert cache.digest(staged_path, "type2_abstracted") != digest
+    (staged_path / "test_c.py").rename(staged_path / "test_d.py")
+    assert cache.digest(staged_path, "type2_abstracted") != digest
@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+
+class Workspace:
+    """Private directory for the artifacts of a single run of the clone detector:
+    the tmp filestructures (staged test files), nicad's output directories, the resulting XML files and the log files.
+
+    Every run gets a new, uniquely named workspace, so that several runs can be started from the same directory at once.
+    A workspace in the system's tmp directory is removed at the end of the run (see remove), one in a given parent directory is kept.
+    Each directory the clone detector is run on gets its own job directory inside the workspace.
+    """
+
+    def __init__(self, parent_dir: str | Path = None) -> None:
+        """Parameters:
+            - parent_dir - directory to create the workspace in. If None, the workspace is created in the system's tmp directory.
+        """
+        self.parent_dir = parent_dir
+        self.root = None
+        self.job_dirs = []
+
+    def create(self):
+        """Creates the workspace directory, if not already created."""
+        if self.root is None:
+            if self.parent_dir is not None:
+                Path(self.parent_dir).mkdir(parents=True, exist_ok=True)
+            self.root = Path(tempfile.mkdtemp(prefix="pyteror_", dir=self.parent_dir)).resolve()
+        return self.root
+
+    def job_dir(self, path: Path) -> Path:
+        """Creates and returns a new job directory in the workspace, for running the clone detector on the given directory."""
+        job_dir = self.create() / Path(str(len(self.job_dirs)) + "_" + path.name)
+        job_dir.mkdir()
+        self.job_dirs.append(job_dir)
+        return job_dir
+
+    def cleanup(self):
+        """Removes the tmp filestructures and nicad's output directories, keeping the resulting XML files and log files.
+        If nothing is left, the workspace itself is removed."""
+        for job_dir in self.job_dirs:
+            for child in job_dir.iterdir():
+                if child.is_dir():
+                    shutil.rmtree(child)
+            if not any(job_dir.iterdir()):
+                job_dir.rmdir()
+        if self.root is not None and not any(self.root.iterdir()):
+            self.root.rmdir()
+            self.root = None
+        self.job_dirs = []
+
+    def remove(self):
+        """Removes the whole workspace, including the resulting XML files and log files.
+        Only for workspaces in the system's tmp directory, a workspace in a given parent directory is kept."""
+        if self.parent_dir is None and self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+        self.job_dirs = []
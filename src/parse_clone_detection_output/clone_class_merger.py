@@ -0,0 +1,101 @@
+import heapq
+from pathlib import Path
+
+
+class CloneClassMerger:
+    """Merges the clone classes of several clone detection reports (e.g. NiCad XML files), so that each clone class is refactored once.
+
+    Clones are normalized to (resolved filepath, start line) members, so the same function is recognized across reports.
+    Reports are combined with a streaming k-way merge, which requires each report to be in merge order:
+    sorted by size (largest first) and then by members (see merge_key). Reports which are not, are sorted first with sort_report.
+    As a clone class always comes before its subsets in the merged order,
+    a clone class is dropped if all of its members are in one clone class which was already yielded, using an index from member to clone classes.
+    Clone classes which only partially overlap are all kept.
+    """
+
+    def __init__(self) -> None:
+        self.resolved_paths = {} #path -> resolved path
+        self.member_index = {} #(filepath, start line) -> set of IDs of yielded clone classes containing the member
+        self.n_classes = 0
+        self.duplicates = 0
+
+    def merge_key(members) -> tuple:
+        """Returns the key of the merge order of a clone class, given its (filepath, start line) members:
+        size (largest first), and then the sorted members with the filepaths as strings."""
+        return (-len(members), tuple(sorted((str(path), lineno) for path, lineno in members)))
+
+    def resolve(self, path) -> Path:
+        resolved = self.resolved_paths.get(path)
+        if resolved is None:
+            resolved = Path(path).resolve()
+            self.resolved_paths[path] = resolved
+            self.resolved_paths[resolved] = resolved
+        return resolved
+
+    def normalize(self, clone_class: dict):
+        """Returns the clone class (dict from filepath to list of line numbers) with resolved filepaths and int line numbers,
+        and its merge key (see merge_key)."""
+        normalized = {}
+        for path, linenumbers in clone_class.items():
+            linenos = normalized.setdefault(self.resolve(path), [])
+            for lineno in linenumbers:
+                if int(lineno) not in linenos:
+                    linenos.append(int(lineno))
+        return normalized, CloneClassMerger.merge_key([(path, lineno) for path, linenos in normalized.items() for lineno in linenos])
+
+    def sort_report(self, clone_classes):
+        """Yields the clone classes of a report in merge order.
+        The whole report is read before the first clone class is yielded, keeping a tuple of (resolved filepath, start line) members
+        per clone class in memory (filepaths are shared). Clone classes are built again from their members as they are yielded."""
+        report = []
+        for clone_class in clone_classes:
+            normalized, _ = self.normalize(clone_class)
+            report.append(tuple((path, lineno) for path, linenos in normalized.items() for lineno in linenos))
+        report.sort(key=CloneClassMerger.merge_key)
+
+        for members in report:
+            clone_class = {}
+            for path, lineno in members:
+                clone_class.setdefault(path, []).append(lineno)
+            yield clone_class
+
+    def iter_entries(self, clone_classes):
+        """Yields the merge key and normalized clone class of each clone class of a report, as the report is read."""
+        for clone_class in clone_classes:
+            normalized, key = self.normalize(clone_class)
+            yield key, normalized
+
+    def is_duplicate(self, members) -> bool:
+        """Returns True if all members are in a single clone class already yielded (identical class, or a subset of it)."""
+        class_ids = self.member_index.get(members[0])
+        if class_ids is None:
+            return False
+        class_ids = set(class_ids)
+        for member in members[1:]:
+            class_ids &= self.member_index.get(member, set())
+            if not class_ids:
+                return False
+        return True
+
+    def merge(self, reports):
+        """Yields the merged and de-duplicated clone classes of the given reports, reading each report as the merge proceeds.
+
+        Parameters:
+            - reports - list of iterables of clone classes in the format of NicadParser.parse, one iterable per report, each in merge order.
+                If a report is not in merge order, its subsets of earlier clone classes may not be dropped.
+
+        Returns:
+            generator of clone classes, dicts from (resolved) filepath object to a list of line numbers specifying start of clone
+        """
+        entries = [self.iter_entries(report) for report in reports]
+        for (size, members), clone_class in heapq.merge(*entries, key=lambda entry: entry[0]):
+            if len(members) < 2:
+                #not a clone class after removing repeated clones
+                continue
+            if self.is_duplicate(members):
+                self.duplicates += 1
+                continue
+            for member in members:
+                self.member_index.setdefault(member, set()).add(self.n_classes)
+            self.n_classes += 1
+            yield clone_class
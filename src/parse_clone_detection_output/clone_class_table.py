@@ -0,0 +1,85 @@
+from array import array
+from pathlib import Path
+
+
+class CloneClassTable:
+    """Compact, column-oriented table of clone classes.
+
+    Each clone (a member of a clone class) is one row, stored in four int arrays: class ID, file ID, start line and end line.
+    An end line of 0 means the end line is unknown, as for clone classes added from the format of NicadParser.parse.
+    Rows of the same clone class are contiguous, and class IDs are assigned in increasing order from 0.
+    Filepaths are interned in a path table, so each file is a single Path object no matter how many clones it has.
+
+    Iterating over the table yields each clone class in the same format as NicadParser.parse:
+    a dict from (absolute) filepath object to a list of linenumbers specifying start of clone.
+
+    Used wherever all clone classes are held at once: the results of ShardedCloneDetector, and in main with --export or --parse-jobs.
+    Otherwise clone classes are streamed from the parsers to refactoring as dicts, one at a time, and never all kept in memory.
+    """
+
+    def __init__(self) -> None:
+        self.paths = [] #file ID -> Path
+        self.path_ids = {} #Path -> file ID
+        self.class_ids = array('i')
+        self.file_ids = array('i')
+        self.startlines = array('i')
+        self.endlines = array('i')
+        self.n_classes = 0
+
+    def __len__(self):
+        """Number of clone classes in the table."""
+        return self.n_classes
+
+    def __iter__(self):
+        for rows in self.iter_class_rows():
+            class_dict = {}
+            for row in rows:
+                class_dict.setdefault(self.paths[self.file_ids[row]], []).append(self.startlines[row])
+            yield class_dict
+
+    def get_file_id(self, path: Path) -> int:
+        """Returns the file ID of the given path, adding it to the path table if not already there."""
+        file_id = self.path_ids.get(path)
+        if file_id is None:
+            file_id = len(self.paths)
+            self.paths.append(path)
+            self.path_ids[path] = file_id
+        return file_id
+
+    def add_class(self, clones) -> int:
+        """Adds a clone class to the table.
+
+        Parameters:
+            - clones - iterable of (file ID, start line, end line) tuples, one per clone in the class
+
+        Returns:
+            The class ID of the new clone class.
+        """
+        class_id = self.n_classes
+        for file_id, startline, endline in clones:
+            self.class_ids.append(class_id)
+            self.file_ids.append(file_id)
+            self.startlines.append(startline)
+            self.endlines.append(endline)
+        self.n_classes += 1
+        return class_id
+
+    def add_class_dict(self, class_dict: dict) -> int:
+        """Adds a clone class in the format of NicadParser.parse. End lines are unknown in this format, and are set to 0."""
+        return self.add_class((self.get_file_id(path), int(lineno), 0) for path, linenumbers in class_dict.items() for lineno in linenumbers)
+
+    def iter_class_rows(self):
+        """Yields a range of row indices for each clone class, in order of class ID."""
+        start = 0
+        n_rows = len(self.class_ids)
+        class_ids = self.class_ids
+        while start < n_rows:
+            end = start + 1
+            while end < n_rows and class_ids[end] == class_ids[start]:
+                end += 1
+            yield range(start, end)
+            start = end
+
+    def get_clones(self, rows) -> list:
+        """Returns the (file ID, start line, end line) tuples of the given rows."""
+        return [(self.file_ids[row], self.startlines[row], self.endlines[row]) for row in rows]
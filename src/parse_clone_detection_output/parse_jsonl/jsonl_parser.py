@@ -0,0 +1,87 @@
+import os
+import json
+import tempfile
+from pathlib import Path
+
+class JsonlParser():
+    """Parses (and writes) clone classes in PyTeRor's own line-oriented JSON format, a compact alternative to nicad's XML output.
+    Files are small, and can be read back without an XML parser, one clone class per line.
+
+    The first line is a header object with the format version, a path table (list of absolute filepaths),
+    and whether the clone classes are in merge order (see CloneClassMerger).
+    Each following line is one clone class, a flat list of integers: file ID (index in the path table) and start line of each clone.
+    Files of version 1 also had the end line of each clone, which is skipped when read.
+
+    Parsing yields clone classes in the same format as NicadParser.iter_parse:
+    each clone class (matching clones) is a dict
+    DICT: from path to int, (absolute, not relative) filepath object to a list of linenumbers specifying start of clone
+    """
+    format_name = "pyteror-clone-classes"
+    version = 2
+    supported_versions = (1, 2)
+
+    def __init__(self, jsonl_file: str | Path) -> None:
+        self.jsonl_file = Path(jsonl_file)
+
+    def iter_parse(self):
+        """Parses the file provided in the construction of the object incrementally, yielding each clone class as it is read."""
+        path = self.read_header()
+        return self.iter_clone_classes(path)
+
+    def read_header(self) -> Path:
+        """Checks the file provided in the construction of the object, and reads its path table. Returns the resolved path of the file."""
+        path = self.jsonl_file.resolve()
+        assert path.exists(), "File does not exist: " + str(path)
+        assert path.is_file(), "Path does not lead to a file: " + str(path)
+
+        with open(path) as f:
+            header = json.loads(f.readline())
+        assert header.get("format") == JsonlParser.format_name, "File is not a PyTeRor clone class file: " + str(path)
+        assert header.get("version") in JsonlParser.supported_versions, "Unsupported version of clone class file: " + str(header.get("version"))
+        #integers per clone in each row
+        self.row_width = 3 if header["version"] == 1 else 2
+        self.paths = [Path(filepath) for filepath in header["paths"]]
+        self.merge_order = header.get("merge_order", False)
+        return path
+
+    def iter_rows(self, path):
+        """Yields the list of integers on each line after the header."""
+        with open(path) as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def iter_clone_classes(self, path):
+        paths = self.paths
+        row_width = self.row_width
+        for row in self.iter_rows(path):
+            clone_class = {}
+            for i in range(0, len(row), row_width):
+                clone_class.setdefault(paths[row[i]], []).append(row[i + 1])
+            yield clone_class
+
+    def write(table, jsonl_file: str | Path):
+        """Writes the clone classes of a CloneClassTable to the given file, with resolved filepaths.
+        Clone classes are written in the merge order of CloneClassMerger (largest first), and the header says so,
+        so that the file can be merged with other reports without sorting it first.
+        Written to a temporary file first, so that the file is never left half-written."""
+        from ..clone_class_merger import CloneClassMerger #import here, this module can be run on its own
+        jsonl_file = Path(jsonl_file)
+        paths = [Path(filepath).resolve() for filepath in table.paths]
+        header = {"format": JsonlParser.format_name, "version": JsonlParser.version, "paths": [str(filepath) for filepath in paths], "merge_order": True}
+
+        rows = []
+        for class_rows in table.iter_class_rows():
+            row = []
+            for file_id, startline, endline in table.get_clones(class_rows):
+                row += [file_id, startline]
+            rows.append(row)
+        rows.sort(key=lambda row: CloneClassMerger.merge_key([(paths[row[i]], row[i + 1]) for i in range(0, len(row), 2)]))
+
+        fd, tmp_path = tempfile.mkstemp(dir=jsonl_file.resolve().parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(header) + "\n")
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, jsonl_file)
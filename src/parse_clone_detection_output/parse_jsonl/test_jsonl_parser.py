@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+from src.parse_clone_detection_output.parse_jsonl.jsonl_parser import JsonlParser
+from src.parse_clone_detection_output.clone_class_table import CloneClassTable
+from src.parse_clone_detection_output.clone_class_merger import CloneClassMerger
+
+#run from the repository root (python -m pytest), as the modules are imported through src
+
+
+def exported(tmp_path, clone_classes):
+    table = CloneClassTable()
+    for clone_class in clone_classes:
+        table.add_class_dict(clone_class)
+    jsonl_path = tmp_path / "clones.jsonl"
+    JsonlParser.write(table, jsonl_path)
+    return jsonl_path
+
+
+def test_round_trip(tmp_path):
+    a, b = (tmp_path / "test_a.py").resolve(), (tmp_path / "test_b.py").resolve()
+    clone_classes = [{a: [1, 9]}, {a: [20], b: [3, 12, 30]}, {b: [40, 50]}]
+    parser = JsonlParser(exported(tmp_path, clone_classes))
+    imported = list(parser.iter_parse())
+
+    #written in merge order, largest first
+    assert imported == list(CloneClassMerger().sort_report(clone_classes))
+    assert imported[0] == {a: [20], b: [3, 12, 30]}
+    assert parser.merge_order
+
+
+def test_paths_are_resolved(tmp_path):
+    relative = Path("some_dir") / ".." / "test_a.py"
+    imported = list(JsonlParser(exported(tmp_path, [{relative: [1, 5]}])).iter_parse())
+    assert imported == [{relative.resolve(): [1, 5]}]
+
+
+def test_reads_version_1(tmp_path):
+    a = (tmp_path / "test_a.py").resolve()
+    jsonl_path = tmp_path / "clones.jsonl"
+    header = {"format": JsonlParser.format_name, "version": 1, "paths": [str(a)], "merge_order": True}
+    jsonl_path.write_text(json.dumps(header) + "\n" + json.dumps([0, 1, 4, 0, 9, 0]) + "\n")
+    assert list(JsonlParser(jsonl_path).iter_parse()) == [{a: [1, 9]}]
@@ -10,10 +10,12 @@ class NicadParser():
     DICT: from path to int, (absolute, not relative) filepath object to a list of linenumbers specifying start of clone
     """
 
-    def __init__(self, xml_file: str | Path, orig_filepath: str | Path = None, tmp_filepath: str | Path = None) -> None:
+    def __init__(self, xml_file: str | Path, orig_filepath: str | Path = None, tmp_filepath: str | Path = None, lineno_maps: dict = None) -> None:
         self.xml_file = Path(xml_file)
         self.tmp_filepath = None
         self.orig_filepath = None
+        #str path of file (relative to tmp_filepath) -> list of original line numbers, for files where only the test functions were extracted
+        self.lineno_maps = lineno_maps
         if orig_filepath != None:
             self.orig_filepath = Path(orig_filepath)
         if tmp_filepath != None:
@@ -27,34 +29,114 @@ class NicadParser():
         each clone class represented by a dict from path to int: 
         (absolute) filepath object to a list of linenumbers specifying start of clone
  """
+        return list(self.iter_parse())
+
+    def iter_parse(self):
+        """Parses the xml file provided in the construction of the object incrementally,
+        yielding each clone class (same format as in the list returned by parse) as soon as its element has been read.
+        Elements are cleared once processed, so memory use does not grow with the size of the file."""
         path = self.xml_file.resolve()
 
         assert path.exists(), "File does not exist: " + str(path)
         assert path.is_file(), "Path does not lead to a file: " + str(path)
         assert path.suffix == ".xml", "File not specified as XML file: " + str(path)
 
+        return self.iter_clone_classes(path)
+
+    def parse_table(self, table = None):
+        """Parses the xml file provided in the construction of the object into a CloneClassTable (with end lines).
+        If a table is given, the clone classes are added to it, so that several files can share one path table.
+        Returns the table."""
+        from ..clone_class_table import CloneClassTable #import here, this module can be run on its own
+        if table is None:
+            table = CloneClassTable()
+        path = self.xml_file.resolve()
+        assert path.exists(), "File does not exist: " + str(path)
+
+        file_ids = {} #file attribute -> file ID in table
+        for clones in self.iter_sources(path):
+            rows = []
+            for file, startline, endline in clones:
+                file_id = file_ids.get(file)
+                if file_id is None:
+                    file_id = file_ids[file] = table.get_file_id(self.convert_path(Path(file)))
+                rows.append((file_id, startline, endline))
+            table.add_class(rows)
+        return table
 
-        clone_classes_list = []
-        #parse XML
-        tree = ET.parse(path) 
-        root = tree.getroot()
-        for clone_class in root.findall("class"):
+    def iter_clone_classes(self, path):
+        converted_paths = {} #file attribute -> converted path, so there is one Path object per file
+        for clones in self.iter_sources(path):
             class_dict = {}
-            for child in clone_class:
-                child_path = self.convert_path(Path(child.attrib['file']))     
-                
-                lineno = child.attrib['startline']
-                if not child_path in class_dict:
-                    class_dict[child_path] = [lineno]
-                else:
-                    class_dict[child_path].append(lineno)
-            clone_classes_list.append(class_dict)
-            
-        return clone_classes_list
+            for file, startline, endline in clones:
+                child_path = converted_paths.get(file)
+                if child_path is None:
+                    child_path = converted_paths[file] = self.convert_path(Path(file))
+                class_dict.setdefault(child_path, []).append(startline)
+            yield class_dict
+
+    def iter_sources(self, path):
+        """Yields a list of (file attribute, start line, end line) for each clone class in the xml file at the given path.
+        Line numbers are converted to line numbers in the original files.
+        The file can either contain clone classes (<class> elements), or clone pairs (<clone> elements) if nicad was run without clustering.
+        Clone pairs are clustered into clone classes as they are read, with a union-find over the pcid (unique ID of a function in nicad) of each clone.
+        Only the union-find and the clone of each pcid are kept, and the clone classes are yielded once the whole file has been read,
+        each ordered and the clone classes ordered by first occurrence in the pairs."""
+        lineno_maps = {} #file attribute -> line number map of file (or None)
+        clusters = None #union-find over pcids, created on the first clone pair
+        pair_clones = {} #pcid -> (file attribute, start line, end line)
+        root = None
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag != "class" and elem.tag != "clone":
+                continue
+
+            clones = []
+            for child in elem:
+                file = child.attrib['file']
+                if file not in lineno_maps:
+                    lineno_maps[file] = self.get_lineno_map(Path(file))
+                lineno_map = lineno_maps[file]
+                startline = int(child.attrib['startline'])
+                endline = int(child.attrib['endline'])
+                if lineno_map is not None:
+                    startline = lineno_map[startline - 1]
+                    endline = lineno_map[endline - 1]
+                clones.append((child.attrib.get('pcid', (file, startline)), (file, startline, endline)))
+            #processed elements are removed from the tree
+            root.clear()
+
+            if elem.tag == "class":
+                yield [clone for pcid, clone in clones]
+            elif clones != []:
+                if clusters is None:
+                    from ..union_find import UnionFind #import here, this module can be run on its own
+                    clusters = UnionFind()
+                first_pcid = clones[0][0]
+                for pcid, clone in clones:
+                    pair_clones[pcid] = clone
+                    clusters.union(first_pcid, pcid)
+
+        if clusters is not None:
+            for group in clusters.groups():
+                yield [pair_clones[pcid] for pcid in group]
 
 
     def convert_path(self, path):
         """Takes a path in the temporary filepath, and replaces it with a path to the same file in the original directory"""
         if not self.tmp_filepath is None:
             return Path(str(path).replace(str(self.tmp_filepath), str(self.orig_filepath)))
-        return path
\ No newline at end of file
+        return path
+
+    def get_lineno_map(self, path):
+        """Returns the line number map of the given path in the temporary filepath, or None if the file was not extracted."""
+        if self.lineno_maps is None or self.tmp_filepath is None:
+            return None
+        try:
+            return self.lineno_maps.get(str(path.relative_to(self.tmp_filepath)))
+        except ValueError:
+            #not in the temporary filepath
+            return None
@@ -0,0 +1,80 @@
+import random
+from pathlib import Path
+from clone_class_merger import CloneClassMerger
+
+
+def merged(reports):
+    merger = CloneClassMerger()
+    result = list(merger.merge([merger.sort_report(report) for report in reports]))
+    return result, merger.duplicates
+
+
+def test_drops_identical_and_subset():
+    report1 = [{"/a.py": [1, 5, 9]}]
+    report2 = [{"/a.py": [9, 1, 5]}, {"/a.py": [1, 5]}]
+    result, duplicates = merged([report1, report2])
+    assert result == [{Path("/a.py"): [1, 5, 9]}]
+    assert duplicates == 2
+
+
+def test_keeps_partial_overlap():
+    result, duplicates = merged([[{"/a.py": [1, 5]}], [{"/a.py": [5], "/b.py": [3]}]])
+    assert len(result) == 2
+    assert duplicates == 0
+
+
+def test_subset_before_superset():
+    #the superset comes later in its report, but is merged first
+    report1 = [{"/a.py": [1, 5]}, {"/b.py": [2, 4]}]
+    report2 = [{"/c.py": [7, 8]}, {"/a.py": [1, 5, 9]}]
+    result, duplicates = merged([report1, report2])
+    assert result[0] == {Path("/a.py"): [1, 5, 9]}
+    assert {Path("/a.py"): [1, 5]} not in result
+    assert duplicates == 1
+
+
+def test_repeated_clones():
+    result, duplicates = merged([[{"/a.py": [1, 1]}], [{"/a.py": [3, 4]}]])
+    assert result == [{Path("/a.py"): [3, 4]}]
+
+
+def test_sort_report_keeps_clone_order():
+    merger = CloneClassMerger()
+    report = list(merger.sort_report([{"/b.py": [9, 2], "/a.py": [4]}, {"/a.py": [1, 2]}]))
+    assert report == [{Path("/b.py"): [9, 2], Path("/a.py"): [4]}, {Path("/a.py"): [1, 2]}]
+
+
+def test_streams_sorted_reports():
+    def report(clone_classes, read):
+        for clone_class in clone_classes:
+            read.append(clone_class)
+            yield clone_class
+
+    read = []
+    merger = CloneClassMerger()
+    merged_classes = merger.merge([report([{"/a.py": [1, 2, 3]}, {"/a.py": [4, 5]}], read), report([{"/b.py": [1, 2]}], read)])
+    next(merged_classes)
+    #only the first clone class of each report has been read
+    assert len(read) == 2
+
+
+def test_same_as_pairwise_dedupe():
+    rng = random.Random(1)
+    for trial in range(300):
+        reports = []
+        for _ in range(rng.randint(2, 4)):
+            reports.append([{"/" + path + ".py": rng.sample(range(6), rng.randint(1, 3)) for path in rng.sample("abc", rng.randint(1, 2))}
+                for _ in range(rng.randint(0, 5))])
+        result, duplicates = merged(reports)
+
+        #reference: all clone classes largest first, each kept unless a subset of one kept before it
+        clone_classes = [frozenset((path, lineno) for path, linenos in clone_class.items() for lineno in linenos) for report in reports for clone_class in report]
+        clone_classes = [members for members in clone_classes if len(members) > 1]
+        clone_classes.sort(key=lambda members: (-len(members), sorted(members)))
+        kept = []
+        for members in clone_classes:
+            if not any(members <= other for other in kept):
+                kept.append(members)
+
+        assert [frozenset((str(path), lineno) for path, linenos in clone_class.items() for lineno in linenos) for clone_class in result] == kept
+        assert duplicates == len(clone_classes) - len(kept)
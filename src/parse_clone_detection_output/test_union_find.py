@@ -0,0 +1,44 @@
+import random
+from union_find import UnionFind
+
+
+def test_groups():
+    clusters = UnionFind()
+    clusters.union(1, 2)
+    clusters.union(3, 4)
+    clusters.union(5, 5)
+    clusters.union(4, 2)
+    clusters.add(6)
+
+    assert clusters.groups() == [[1, 2, 3, 4], [5], [6]]
+    assert clusters.find(1) == clusters.find(4)
+    assert clusters.find(5) != clusters.find(1)
+
+
+def test_same_as_connected_components():
+    rng = random.Random(1)
+    for trial in range(200):
+        clusters = UnionFind()
+        edges = [(rng.randrange(40), rng.randrange(40)) for _ in range(rng.randrange(60))]
+        for first, second in edges:
+            clusters.union(first, second)
+
+        #reference: grow each component from its first element, by first occurrence
+        order = list(dict.fromkeys(element for edge in edges for element in edge))
+        seen = set()
+        components = []
+        for element in order:
+            if element in seen:
+                continue
+            component = {element}
+            changed = True
+            while changed:
+                changed = False
+                for first, second in edges:
+                    if (first in component) != (second in component):
+                        component |= {first, second}
+                        changed = True
+            seen |= component
+            components.append([other for other in order if other in component])
+
+        assert clusters.groups() == components
@@ -0,0 +1,37 @@
+class UnionFind:
+    """Disjoint-set forest over hashable elements, used for merging clones into clone classes.
+    Elements are added on first use. Uses path halving and union by size."""
+
+    def __init__(self) -> None:
+        self.parent = {}
+        self.size = {}
+
+    def add(self, element):
+        if element not in self.parent:
+            self.parent[element] = element
+            self.size[element] = 1
+
+    def find(self, element):
+        self.add(element)
+        parent = self.parent
+        while parent[element] != element:
+            parent[element] = parent[parent[element]]
+            element = parent[element]
+        return element
+
+    def union(self, element1, element2):
+        root1 = self.find(element1)
+        root2 = self.find(element2)
+        if root1 == root2:
+            return
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.size[root1] += self.size[root2]
+
+    def groups(self):
+        """Returns a list of groups (lists of elements), each group ordered and the groups ordered by when their elements were first added."""
+        groups = {}
+        for element in self.parent:
+            groups.setdefault(self.find(element), []).append(element)
+        return list(groups.values())
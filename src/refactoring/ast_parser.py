@@ -1,15 +1,16 @@
 import ast
 #from black import FileMode, format_str
 from pathlib import Path;
+from concurrent.futures import ProcessPoolExecutor
 from .unparser import Unparser
 from .clone_ast_utilities import CloneASTUtilities
+from .module_analysis import ModuleAnalysis
 
 class ASTParser():
     """Class which includes static methods for parsing and unparsing an AST for a file.
     Also does some sanity checks to make sure the file is correct, 
     in addition to formatting the pytest.mark.parametrize decorator line.
     """
-    tests = 0
     def parse_file_to_AST(path : str | Path ) -> ast.AST:
         """Takes a filename, checks validity (.py file, and exists) and 
         returns a complete abstract syntax tree (AST) for the file, from the 'ast' module
@@ -56,14 +57,45 @@ class ASTParser():
             file.write(f'{target_sc}')
 
 
-    def count_tests(path: str | Path):
-        path = Path(path).resolve()
+    def count_tests(filepaths, jobs: int = 1) -> dict:
+        """Counts the tests in each of the given files.
+        Files which have already been analysed (see ModuleAnalysis) are counted from their AST.
+        The other files are parsed only to count their tests, and their ASTs are not kept. With jobs > 1, they are parsed in a pool of worker processes.
 
-        for file in [str(file) for file in path.rglob('*') if file.is_file()]:
-            parsed_ast = ASTParser.parse_file_to_AST(file)
-            
-            if type(parsed_ast) == ast.Module:
-                ASTParser.tests += CloneASTUtilities.count_tests(parsed_ast)
+        Parameters:
+            - filepaths - list of paths to python files
+            - jobs - number of worker processes
+
+        Returns:
+            dict from filepath (as given) to number of tests in said file
+        """
+        counts = {}
+        to_parse = []
+        for file in filepaths:
+            if ModuleAnalysis.is_loaded(Path(file)):
+                counts[file] = ASTParser.count_tests_in_AST(ModuleAnalysis.get(file).ast_base)
+            else:
+                counts[file] = None
+                to_parse.append(file)
+
+        if jobs > 1 and to_parse != []:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                chunksize = max(1, len(to_parse) // (jobs * 4))
+                for file, cnt in zip(to_parse, pool.map(ASTParser.count_tests_in_file, to_parse, chunksize=chunksize)):
+                    counts[file] = cnt
+        else:
+            for file in to_parse:
+                counts[file] = ASTParser.count_tests_in_file(file)
+        return counts
+
+    def count_tests_in_file(filepath: Path) -> int:
+        """Worker function for ASTParser.count_tests. Parses the file and counts its tests."""
+        return ASTParser.count_tests_in_AST(ASTParser.parse_file_to_AST(filepath))
+
+    def count_tests_in_AST(parsed_ast) -> int:
+        if type(parsed_ast) == ast.Module:
+            return CloneASTUtilities.count_tests(parsed_ast)
+        return 0
 
     
     #--- no longer used ---
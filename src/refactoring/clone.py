@@ -4,6 +4,7 @@ from .decorator_checker import DecoratorChecker
 from .parametrize_decorator import ParametrizeDecorator
 from .parametrize_decorator import parse_argnames_and_argvals
 from .clone_ast_utilities import CloneASTUtilities
+from .flat_ast import FlatAST
 
 class Clone():
     """Keeps track of a single clone, including its node in the AST, and the file it came from."""
@@ -20,7 +21,7 @@ class Clone():
 
         self.bad_parametrize_decorator = False #True if a decorator has a func call or name instead of values.
         self.is_fixture : bool = False
-        self.unknown_decorators_list = []
+        self.unknown_decorators_list = [] #keys of decorators which are not known (see DecoratorChecker.decorator_key)
 
         self.param_decorator = ParametrizeDecorator(1)
         self.param_dec_nodes = []
@@ -32,6 +33,7 @@ class Clone():
         self.refactored = False
         self.filehandler.add_clone(self)
         self.docstring = None
+        self.flat_ast = None #see get_flat_ast
 
         #only used by target
         self.target_marks = []
@@ -192,19 +194,14 @@ class Clone():
             
             if unknown_decorator:
 
-                self.unknown_decorators_list.append(ast.unparse(decorator))
+                self.unknown_decorators_list.append(DecoratorChecker.decorator_key(decorator))
         
         for decorator in to_remove:
             self.ast_node.decorator_list.remove(decorator)
                 
 
     def is_local_variable(self, str_var):
-        try: 
-            symbol = self.filehandler.symtable.lookup(str_var)
-            return symbol.is_local()
-
-        except KeyError:
-            return False
+        return str_var in self.filehandler.module_locals
 
     #TODO: if implementing reading pytest.ini for overriding test name, implement it here too.
     def is_test(self):
@@ -246,8 +243,20 @@ class Clone():
         return not self.name_is_parametrized(name_str) and name_str in self.get_param_names_as_strlist()
 
 
+    def set_refactored(self):
+        self.refactored = True
+        self.filehandler.set_refactored()
+
     def get_ast_node(self):
         return self.ast_node
+
+    def get_flat_ast(self):
+        """Returns the FlatAST of the clone's node, flattened on first use,
+        so that clone classes split off from the clone's class do not flatten it again.
+        Set self.flat_ast to None when the node is changed."""
+        if self.flat_ast is None:
+            self.flat_ast = FlatAST(self.ast_node)
+        return self.flat_ast
     
     def detach(self):
         """Detach this clone's node from the AST."""
@@ -6,14 +6,13 @@ import ast
 class CloneASTUtilities:
     """Includes a set of static functions to find clones and compare clones"""
 
-    def find_clone_node_in_AST(ast_base, clone_lineno: int, filehandler):
+    def find_clone_node_in_AST(clone_lineno: int, filehandler):
         """For a single clone, finds AST-node of clone based on line number of function definition.
 
 
         Parameters:
-            - ast_base - base of an AST from 'ast' module
             - clone_lineno - line number of the specific clone we are looking for
-            - filehandler - object handling the file this AST originates from. Sent through to clone when it are initialised.
+            - filehandler - object handling the file of the clone, whose function index is searched. Sent through to clone when it are initialised.
 
         Returns:
             A single Clone object, representing the clone found at given line number.
@@ -22,14 +21,36 @@ class CloneASTUtilities:
         # import here, otherwise circular import
         from .clone import Clone
 
-        # only for one file
-        for node in ast_base.body:
-            if isinstance(node, ast.FunctionDef) and node.lineno == clone_lineno:
-                return Clone(node, parent_node=ast_base, lineno=node.lineno, filehandler=filehandler)
-            elif isinstance(node, ast.ClassDef):
-                for class_node in node.body:
-                    if (isinstance(class_node, ast.FunctionDef) and class_node.lineno == clone_lineno):
-                        return Clone(class_node, parent_node=node, lineno=class_node.lineno, filehandler=filehandler)
+        function_info = filehandler.function_index.get(clone_lineno)
+        if function_info is None:
+            return None
+        node, parent_node, first, last = function_info
+        return Clone(node, parent_node=parent_node, lineno=node.lineno, filehandler=filehandler)
+
+    def index_functions(ast_base) -> dict:
+        """Indexes the functions which can be clones: functions in the module body, and methods of (possibly nested) classes.
+
+        Parameters:
+            - ast_base - base of an AST from 'ast' module
+
+        Returns:
+            dict from line number of function definition, and from line number of its first decorator,
+            to a tuple (FunctionDef node, parent node, first line, last line).
+            First line is the line of the first decorator (or the function definition), last line is the last line of the function body.
+        """
+        index = {}
+        parents = [ast_base]
+        while parents != []:
+            parent_node = parents.pop()
+            for node in parent_node.body:
+                if isinstance(node, ast.FunctionDef):
+                    first = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                    function_info = (node, parent_node, first, node.end_lineno)
+                    index[node.lineno] = function_info
+                    index.setdefault(first, function_info)
+                elif isinstance(node, ast.ClassDef):
+                    parents.append(node)
+        return index
 
     def count_tests(ast_base) -> int:
         cnt = 0
@@ -7,10 +7,13 @@ from .name_node_difference import NameNodeDifference
 from .attribute_node_difference import AttributeNodeDifference
 from .target_parametrize_decorator import TargetParametrizeDecorator
 from .kw_call_node_set import KwCallNodeSet
+from .local_definition_index import LocalDefinitionIndex
+from .decorator_checker import DecoratorChecker
 
 
 import ast
 import sys
+from collections import Counter
 
 
 class CloneClass():
@@ -55,6 +58,7 @@ class CloneClass():
         self.inconsistent_local_identifiers = False
         self.crossmodule_and_different_global_identifiers = False
         self.split = False #whether this clone class has been split
+        self.keyword_split_groups = [] #split groups of each set of calls with different keyword parameters, found by get_clone_differences
         
         self.names_with_store_ctx = [] 
         #a list of NameNodeDifference objects which arent actually necessarily differences
@@ -122,7 +126,7 @@ class CloneClass():
             clone = self.clones[ind]
             #clone.unknown_decorators_list.sort() #genius, but wrong.
 
-            split_groups.setdefault(str(clone.unknown_decorators_list), []).append(ind)
+            split_groups.setdefault(tuple(clone.unknown_decorators_list), []).append(ind)
         if (len(split_groups.values()) > 1):
             for ind in range(len(self.clones)):
                 clone = self.clones[ind]
@@ -154,96 +158,111 @@ class CloneClass():
         
 
     def get_clone_differences(self):
-        """Travels recursively down through the AST, looking for nodes that are different.
+        """Travels down through the ASTs of the clones in lockstep, looking for nodes that are different.
         When a difference is found, a NodeDifference object is created and added to self.nodeDifferences.
+
+        Each clone is flattened once into preorder arrays (see FlatAST), and walked iteratively with a stack of frames,
+        one frame per level: the parent node of each clone, the children of each parent node, and the position among the children.
+        Subtrees with the same hash in every clone are skipped, unless they contain nodes which are always visited (see FlatAST.needs_visit).
         """
-        def get_differences_recursive(parent_nodes: list):
-            #starts at clone nodes, works its way down AST
-            #saves info on whether potential differences are on left side of an assign statement
+        flat_clones = [clone.get_flat_ast() for clone in self.clones]
+        n_clones = len(flat_clones)
+
+        stack = [self.new_difference_frame(flat_clones, [0] * n_clones)]
+        while stack != []:
+            frame = stack[-1]
+            parent_nodes, children, n_children, pos = frame
+            if pos == n_children:
+                stack.pop()
+                continue
+            frame[3] += 1
+
+            indices = [children[ind][pos] for ind in range(n_clones)]
+            subtree_hash = flat_clones[0].hashes[indices[0]]
+            if not flat_clones[0].needs_visit[indices[0]] and all(flat_clones[ind].hashes[indices[ind]] == subtree_hash for ind in range(1, n_clones)):
+                #identical subtrees, no differences to be found
+                continue
+
+            child_nodes = [flat_clones[ind].nodes[indices[ind]] for ind in range(n_clones)]
+            child_type = flat_clones[0].types[indices[0]]
             
-            iterators =  []
-            for node in parent_nodes:
-                iterators.append(ast.iter_child_nodes(node))    
-            while True:
-                try:
+            if any(flat_clones[ind].types[indices[ind]] is not child_type for ind in range(1, n_clones)):
+                #if not all same type:
+                #special check for mixture of names and constants:
+                if all(flat_clones[ind].types[indices[ind]] in (ast.Name, ast.Constant) for ind in range(n_clones)):
+                    self.node_differences.append(NodeDifference(child_nodes, parent_nodes, self.target_ind))
+                    continue
+                else:
+                    self.unmatched_asts = False #TODO: change to True and make sure nothing breaks
+                    #rest of the children on this level are not compared
+                    stack.pop()
+                    continue
 
-                    child_nodes = []
-                    
-                    for ite in iterators:
-                        child_nodes.append(next(ite))
-                    
-                    if not all(isinstance(child, type(child_nodes[0])) for child in child_nodes):
-                        #if not all same type:
-                        #special check for mixture of names and constants:
-                        if all((isinstance(child, ast.Name) or isinstance(child, ast.Constant)) for child in child_nodes):
-                            self.node_differences.append(NodeDifference(child_nodes, parent_nodes, self.target_ind))
-                            continue
-                        else:
-                            #print("Differing types of nodes")
-                            #print(child_nodes)
-                            #for node in child_nodes:
-                            #    print(ast.unparse(node))
-                            #for clone in self.clones:
-
-                            #    print(clone.filehandler.filepath)
-                            self.unmatched_asts = False #TODO: change to True and make sure nothing breaks
-                            return
-                    
-                    elif type(child_nodes[0]) == ast.Constant:
-                        if any(child.value != child_nodes[0].value for child in child_nodes):
-                            self.node_differences.append(NodeDifference(child_nodes, parent_nodes, self.target_ind))
-                            continue
+            elif child_type is ast.Constant:
+                key = flat_clones[0].keys[indices[0]]
+                if any(flat_clones[ind].keys[indices[ind]] != key for ind in range(1, n_clones)):
+                    self.node_differences.append(NodeDifference(child_nodes, parent_nodes, self.target_ind))
+                    continue
 
-                    elif type(child_nodes[0]) == ast.Name:
-                        
-                        if type(child_nodes[0].ctx) == ast.Store:  
-                            #create a "spoof" node difference to store locally defined variables (for potential renaming)
-                            self.names_with_store_ctx.append(NameNodeDifference(child_nodes, parent_nodes, self.target_ind))
+            elif child_type is ast.Name:
+                
+                if type(child_nodes[0].ctx) == ast.Store:  
+                    #create a "spoof" node difference to store locally defined variables (for potential renaming)
+                    self.names_with_store_ctx.append(NameNodeDifference(child_nodes, parent_nodes, self.target_ind))
 
-                        if any(child.id != child_nodes[0].id for child in child_nodes):
-                            self.node_differences.append(NameNodeDifference(child_nodes, parent_nodes, self.target_ind))
-                            continue
+                key = flat_clones[0].keys[indices[0]]
+                if any(flat_clones[ind].keys[indices[ind]] != key for ind in range(1, n_clones)):
+                    self.node_differences.append(NameNodeDifference(child_nodes, parent_nodes, self.target_ind))
+                    continue
 
-                    
-                    #for Attribute (value.attr), only check attr, not value (value should be checked recursively later)
-                    elif type(child_nodes[0]) == ast.Attribute and any(child.attr != child_nodes[0].attr for child in child_nodes):
-                        
-                        self.node_differences.append(AttributeNodeDifference(child_nodes, parent_nodes, self.target_ind))
-                        self.attribute_difference = True
-                        continue
+            #for Attribute (value.attr), only check attr, not value (value is checked on the next level)
+            elif child_type is ast.Attribute and any(flat_clones[ind].keys[indices[ind]] != flat_clones[0].keys[indices[0]] for ind in range(1, n_clones)):
+                
+                self.node_differences.append(AttributeNodeDifference(child_nodes, parent_nodes, self.target_ind))
+                self.attribute_difference = True
+                continue
 
-                    elif type(child_nodes[0]) == ast.Import or type(child_nodes[0]) == ast.ImportFrom:
-                        if any(child.module != child_nodes[0].module for child in child_nodes):
-                            self.name_difference_in_import_statement = True
-                            return
-                        for ind in range(len(child_nodes[0].names)):
-                            if any(not CAU.equal_nodes(child.names[ind], child_nodes[0].names[ind]) for child in child_nodes):
-                                self.name_difference_in_import_statement = True
-                                return
-
-                    elif type(child_nodes[0]) == ast.FunctionDef or type(child_nodes[0]) == ast.AsyncFunctionDef:
-                        for ind in range(len(child_nodes[0].args.args)):
-                            param_names = [ast.Name(child_nodes[0].args.args[ind].arg, lineno=child.lineno, ctx = ast.Store) for child in child_nodes]
-                            self.names_with_store_ctx.append(NameNodeDifference(param_names, child_nodes, self.target_ind))
-
-                    elif type(child_nodes[0]) == ast.Call:
-                        if child_nodes[0].keywords != []:
-                            kw_calls = KwCallNodeSet(child_nodes, self.target_ind)
-                            if kw_calls.same_keywords():
-                                #same keywords, sort so they are in same order...
-                                kw_calls.sort_keywords()
-                                #after this, walking the AST, 
-                                #the order of keyword parameters should be the same for function calls
-                            else:
-                                #not same keywords, split clone class
-                                self.split_clone_class(kw_calls.split_groups.values(), " because of a difference in keyword parameters")
-
-                    get_differences_recursive(child_nodes)
-
-                except StopIteration:
-                    break
-            return
-        get_differences_recursive([clone.ast_node for clone in self.clones])
+            elif child_type is ast.Import or child_type is ast.ImportFrom:
+                if any(child.module != child_nodes[0].module for child in child_nodes):
+                    self.name_difference_in_import_statement = True
+                    stack.pop()
+                    continue
+                if any(not CAU.equal_nodes(child.names[ind], child_nodes[0].names[ind]) for ind in range(len(child_nodes[0].names)) for child in child_nodes):
+                    self.name_difference_in_import_statement = True
+                    stack.pop()
+                    continue
+
+            elif child_type is ast.FunctionDef or child_type is ast.AsyncFunctionDef:
+                for ind in range(len(child_nodes[0].args.args)):
+                    param_names = [ast.Name(child_nodes[0].args.args[ind].arg, lineno=child.lineno, ctx = ast.Store) for child in child_nodes]
+                    self.names_with_store_ctx.append(NameNodeDifference(param_names, child_nodes, self.target_ind))
+
+            elif child_type is ast.Call:
+                if child_nodes[0].keywords != []:
+                    kw_calls = KwCallNodeSet(child_nodes, self.target_ind)
+                    if kw_calls.same_keywords():
+                        #same keywords, sort so they are in same order...
+                        kw_calls.sort_keywords()
+                        #after this, walking the AST, 
+                        #the order of keyword parameters should be the same for function calls
+                        stack.append(self.new_difference_frame(flat_clones, indices, reordered = True))
+                        continue
+                    else:
+                        #not same keywords, clone class is split (see partition)
+                        self.keyword_split_groups.append(kw_calls.split_groups.values())
+
+            stack.append(self.new_difference_frame(flat_clones, indices))
+
+    def new_difference_frame(self, flat_clones, indices, reordered = False):
+        """Returns a frame for get_clone_differences, for comparing the children of the nodes on the given indices (one index per clone).
+        Children are only compared up to the number of children of the node with fewest children.
+        If reordered, the children are in the order the nodes now have them (see FlatAST.reordered_children)."""
+        parent_nodes = [flat_clones[ind].nodes[indices[ind]] for ind in range(len(flat_clones))]
+        if reordered:
+            children = [flat_clones[ind].reordered_children(indices[ind]) for ind in range(len(flat_clones))]
+        else:
+            children = [flat_clones[ind].children(indices[ind]) for ind in range(len(flat_clones))]
+        return [parent_nodes, children, min(len(child_list) for child_list in children), 0]
 
     def extract_clone_differences(self):
         """Uses the NodeDifference objects in the self.nodeDifferences list to extract the differences from each clone, 
@@ -315,42 +334,43 @@ class CloneClass():
 
     def find_common_marks(self):
         """Finds pytest.mark decorators which are common between all clones in the class.
-        Adds all common marks into the target's list of common marks."""
-        #handle mark decorators:
+        Adds all common marks into the target's list of common marks, and removes them from each clone's marks.
+
+        Marks are compared by key (see DecoratorChecker.decorator_key), computed once per mark.
+        A mark which a clone has several times is common as many times as every clone has it."""
+        mark_keys = [[DecoratorChecker.decorator_key(mark) for mark in clone.marks] for clone in self.clones]
+        common_counts = Counter(mark_keys[0])
+        for keys in mark_keys[1:]:
+            common_counts &= Counter(keys)
+
+        #common marks are the first clone's nodes, in its order
         common_marks = []
-        for clone in self.clones:
-            for this_mark in clone.marks:
-                in_all = True
-                str_mark = ast.unparse(this_mark)
-                if any(str_mark == ast.unparse(mark) for mark in common_marks):
-                    continue
-                for clone2 in self.clones:
-                    if clone == clone2: continue
-                    if not any(str_mark == ast.unparse(mark) for mark in clone2.marks):
-                        in_all = False
-                        break
-                if in_all:
-                    common_marks.append(this_mark)
-        for common_mark in common_marks:
-            for clone in self.clones:
-                for mark in clone.marks:
-                    if ast.unparse(common_mark) == ast.unparse(mark):
-                        clone.marks.remove(mark)
+        remaining = common_counts.copy()
+        for mark, key in zip(self.clones[0].marks, mark_keys[0]):
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                common_marks.append(mark)
+
+        for clone, keys in zip(self.clones, mark_keys):
+            remaining = common_counts.copy()
+            kept_marks = []
+            for mark, key in zip(clone.marks, keys):
+                if remaining[key] > 0:
+                    remaining[key] -= 1
+                else:
+                    kept_marks.append(mark)
+            #changed in place, the list is shared with self.param_decorator
+            clone.marks[:] = kept_marks
         self.target.set_common_marks(common_marks)
 
 
     def split_on_attributes(self):
         """Goes through list of nodeDifferences and looks for AttributeNodeDifference objects.
-        If an AttributeDifference is found, 
-        splits the clone class into as many classes as there are variants within the AttributeNodeDifference's nodes."""
-        #TODO: check all attributes before splitting. 
-        # Currently only splits on first AttributeNodeDifference (but will recursively split if more differences are found)
-
+        Returns the split groups (lists of indices of clones) of the clone class, one group per combination of variants
+        of every AttributeNodeDifference's nodes."""
         #I guess this is what they call self-documenting code
         attributes = [[] for _ in range(len(self.clones))]
-        nds = []
         for nd in self.node_differences:
-            nds.append(nd)
             if isinstance(nd, AttributeNodeDifference):
                 variants = nd.get_variants_dict()
                 for attr, inds in variants.items():
@@ -366,7 +386,56 @@ class CloneClass():
             else:
                 attr_dict[strvals] = [ind]
         
-        self.split_clone_class(attr_dict.values(), reason = " because of a difference in attributes.")
+        return attr_dict.values()
+
+    def partition(self):
+        """Finds the groups of clones which can be refactored together, in one pass over every reason to split the clone class:
+        a difference in scope or unknown decorators, and differences in keyword parameters, attributes or fixtures found by get_clone_differences.
+        Each reason gives each clone a key (the index of its split group), and clones with the same keys for all reasons are in the same group.
+        The clone class is therefore split once, whatever the number of reasons, and no clone ends up in more than one group.
+
+        The differences are only looked for if the clones have the same scope and unknown decorators,
+        otherwise each group finds its own differences (see split_clone_class).
+
+        Returns:
+            list of groups (lists of indices of clones), and the reasons for splitting, as a string for printing
+        """
+        split_keys = [[] for _ in range(len(self.clones))]
+        reasons = []
+        for split_groups, reason in [(self.check_parent_nodes(), "scope (class vs global)"), (self.check_unknown_decorators(), "decorators")]:
+            if self.add_split_keys(split_keys, split_groups):
+                reasons.append(reason)
+
+        if reasons == []:
+            #print("getting differences")
+            self.get_clone_differences()
+            split_reasons = [(split_groups, "keyword parameters") for split_groups in self.keyword_split_groups]
+            if self.attribute_difference:
+                split_reasons.append((self.split_on_attributes(), "attributes"))
+            fixture_diff = self.fixture_difference
+            if fixture_diff:
+                split_reasons.append((fixture_diff, "fixtures"))
+            for split_groups, reason in split_reasons:
+                if self.add_split_keys(split_keys, split_groups) and reason not in reasons:
+                    reasons.append(reason)
+
+        groups = {}
+        for ind in range(len(split_keys)):
+            groups.setdefault(tuple(split_keys[ind]), []).append(ind)
+        return list(groups.values()), " because of a difference in " + ", ".join(reasons) + "."
+
+    def add_split_keys(self, split_keys, split_groups) -> bool:
+        """Adds the index of each clone's split group to the clone's list of keys in split_keys (see partition).
+        Clones in none of the groups get the key None.
+        Returns False, without adding keys, if there are fewer than two groups."""
+        if len(split_groups) < 2:
+            return False
+        for keys in split_keys:
+            keys.append(None)
+        for group_ind, group in enumerate(split_groups):
+            for ind in group:
+                split_keys[ind][-1] = group_ind
+        return True
 
     def split_clone_class(self, classes, reason = "."):
         """Splits a clone class into n based on parameter classes which has n elements. 
@@ -395,12 +464,12 @@ class CloneClass():
 
         For now, we assume definition of local variables is unconditional.
         """
-        nodes_to_local_lineno_definition : dict = {}
+        nodes_to_local_lineno_definition = LocalDefinitionIndex()
         
         #find earliest definition of local name
         for local_def in self.names_with_store_ctx:
 
-            if not local_def in nodes_to_local_lineno_definition.keys():
+            if not local_def in nodes_to_local_lineno_definition:
                 nodes_to_local_lineno_definition[local_def] = local_def.lineno
         
         for nd in self.node_differences:
@@ -411,21 +480,13 @@ class CloneClass():
 
             #consistency check.
             #INCONSISTENT LOCAL IDENTIFIERS are not parametrizable...
-            non_local_identifier = True
-            for local_def in nodes_to_local_lineno_definition.keys():
-                consistency = local_def.check_consistency(nd)
-                match consistency:
-                    case "inconsistent":
-                        self.inconsistent_local_identifiers = True
-                        return
+            consistency = nodes_to_local_lineno_definition.check_consistency(nd)
+            if consistency == "inconsistent":
+                self.inconsistent_local_identifiers = True
+                return
 
-                    case "consistent":
-                        non_local_identifier = False
-                        break
-                    case "different":
-                        continue
-
-            if non_local_identifier:
+            if consistency == "different":
+                #non-local identifier
                 nodes_to_local_lineno_definition[nd] = float('inf')
                 if not CloneClass.split_separate_modules:
                     #can't have differences unless all are same scope, check this:
@@ -583,23 +644,13 @@ class CloneClass():
                 self.target.target = False
             return
     
-        #check parent nodes of clones, split if different:
-        split_groups = self.check_parent_nodes()
+        #check scope, decorators and differences of clones, split if needed:
+        split_groups, reason = self.partition()
         if len(split_groups) > 1:
             #groups are split and refactored
-            self.split_clone_class(split_groups, reason = " because of a difference in scope (class vs global).")
+            self.split_clone_class(split_groups, reason)
             return
 
-
-        #check unknown decorators of clones, split if different:
-        split_groups = self.check_unknown_decorators()
-        if len(split_groups) > 1:
-            #groups are split and refactored
-            self.split_clone_class(split_groups, reason = " because of a difference in decorators.")
-            return
-
-        #print("getting differences")
-        self.get_clone_differences()
         if self.unmatched_asts:
             #this branch is often triggered by decorators within clones... mismatch between nicad and ast module grammars
             if (self.verbose):
@@ -616,20 +667,6 @@ class CloneClass():
             return
 
 
-        #print("checking whether attribute differences")
-        if self.attribute_difference:
-            #difference in attributes,
-            #split class and return
-            self.split_on_attributes()
-            
-        
-        fixture_diff = self.fixture_difference
-        if fixture_diff:
-            self.split_clone_class(fixture_diff)
-            
-        if self.split:
-            return 
-        
         self.find_common_parametrize_decorators()
 
         self.find_common_marks()
@@ -651,6 +688,8 @@ class CloneClass():
             return
 
         #print("extracting differences")
+        #the target is changed from here on
+        self.target.flat_ast = None
         self.extract_clone_differences()
         if self.parametrizable:
 
@@ -681,7 +720,7 @@ class CloneClass():
             CloneClass.targets_refactored += 1
             for clone in self.clones:
                 CloneClass.tests_parametrized += 1
-                clone.refactored = True
+                clone.set_refactored()
             self.redundant_clones = self.clones[1:]
             self.remove_redundant_clones()
 
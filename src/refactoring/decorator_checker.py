@@ -88,7 +88,8 @@ class DecoratorChecker:
         return False
 
     def is_any_pytest_decorator(decorator):
-        """Checks whether a given node is a pytest decorator.
+        """Checks whether a given node is a pytest decorator:
+        a name starting with 'pytest', or an attribute, subscript or call of one.
 
         Params:
             - decorator - AST-node of decorator to check.
@@ -96,11 +97,28 @@ class DecoratorChecker:
         Returns:
             boolean
         """
-        unparsed = ast.unparse(decorator)
-        if unparsed[:6] == "pytest":
-            return True
-        return False
-    
+        node = decorator
+        while True:
+            if type(node) == ast.Call:
+                node = node.func
+            elif type(node) == ast.Attribute or type(node) == ast.Subscript:
+                node = node.value
+            else:
+                break
+        return type(node) == ast.Name and node.id.startswith("pytest")
+
+    def decorator_key(decorator):
+        """Returns the canonical form of a given decorator, for comparing decorators between clones.
+        Two decorators have the same key if they are the same code, wherever in the file they are.
+
+        Params:
+            - decorator - AST-node of decorator.
+
+        Returns:
+            str, the dump of the AST-node (without line numbers)
+        """
+        return ast.dump(decorator)
+
     def is_pytest_param_call(node):
         if type(node) != ast.Call:
             return False
@@ -1,7 +1,7 @@
 from .clone_ast_utilities import CloneASTUtilities as CAU
 from .target_formatter import TargetFormatter
+from .module_analysis import ModuleAnalysis
 import ast
-import symtable
 
 
 class FileHandler:
@@ -12,11 +12,30 @@ class FileHandler:
         self.clones = []
         self.lineno_info = [] #lineno info for original file
         self.lineno_to_target_clone =  {} #dict from lineno to target Clone object
-        with open(self.filepath, "r") as file:
-            self.lines = file.readlines()
-            reduced = ''.join(self.lines)
-            self.symtable = symtable.symtable(reduced, self.filepath, 'exec')
+        self.analysis = ModuleAnalysis.get(self.filepath)
+        self.lines = list(self.analysis.lines) #copy, lines are removed and inserted when refactoring
+        self._function_index = None
+        self.refactored = False #True once a clone in the file has been refactored
+        self.registry = None #FileHandlerRegistry keeping this FileHandler, if any
 
+    @property
+    def module_locals(self):
+        return self.analysis.module_locals
+
+    @property
+    def function_index(self):
+        """Index of the functions in the file, see CloneASTUtilities.index_functions. Built on first use, before any clone in the file is changed."""
+        if self._function_index is None:
+            self._function_index = CAU.index_functions(self.ast_base)
+        return self._function_index
+
+
+    def set_refactored(self):
+        """Called when a clone in the file is refactored."""
+        if not self.refactored:
+            self.refactored = True
+            if self.registry is not None:
+                self.registry.set_refactored(self)
 
     def add_clone(self, clone):
         self.clones.append(clone)
@@ -122,14 +141,6 @@ class FileHandler:
         (funcdef/first annotation above funcdef, and last statement in body of funcdef).
         ...to lineno_info list for this FileHandler
         """
-        first = clone.lineno
-        last = clone.ast_node.end_lineno
-        for node in CAU.get_all_descendants(clone.ast_node):
-            if hasattr(node, "lineno"):
-                if first > node.lineno:                    
-                    first = node.lineno
-                elif last < node.end_lineno:
-                    last = node.end_lineno
-        
+        node, parent_node, first, last = self.function_index[clone.lineno]
         self.lineno_info.append((first, last))
         #return (clone.lineno, clone.ast_node.body[-1].lineno, len(clone.ast_node.decorator_list))
\ No newline at end of file
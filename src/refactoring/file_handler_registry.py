@@ -0,0 +1,63 @@
+from pathlib import Path
+from collections import OrderedDict
+from .file_handler import FileHandler
+from .module_analysis import ModuleAnalysis
+
+
+class FileHandlerRegistry:
+    """Keeps the FileHandler (and with it, the AST) of each file with clones, keyed by resolved filepath.
+    Iterating over the registry yields the file handlers in the order their files were first seen.
+
+    The analysis (see ModuleAnalysis) of a file is pinned while the file has a FileHandler.
+    If ModuleAnalysis.memory_budget is set, FileHandlers of files without refactored clones are removed by release,
+    least recently used first, and are created again (and the file parsed again) if a later clone class needs them.
+    These FileHandlers are kept in their own ordered set, which a FileHandler leaves once a clone in its file is refactored (see set_refactored).
+    """
+
+    def __init__(self) -> None:
+        self.handlers = {} #resolved filepath -> FileHandler, in order first seen
+        self.releasable = OrderedDict() #FileHandler -> resolved filepath, of files without refactored clones, least recently used first
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def __iter__(self):
+        return iter(list(self.handlers.values()))
+
+    def __contains__(self, filepath):
+        return Path(filepath).resolve() in self.handlers
+
+    def get(self, filepath: str | Path) -> FileHandler:
+        """Returns the FileHandler of the file at the given path, creating it (and parsing the file) if there is none."""
+        key = Path(filepath).resolve()
+        filehandler = self.handlers.get(key)
+        if filehandler is None:
+            analysis = ModuleAnalysis.get(filepath)
+            analysis.set_pinned(True)
+            filehandler = FileHandler(filepath, analysis.ast_base)
+            filehandler.registry = self
+            self.handlers[key] = filehandler
+        if not filehandler.refactored:
+            self.releasable[filehandler] = key
+            self.releasable.move_to_end(filehandler)
+        return filehandler
+
+    def set_refactored(self, filehandler: FileHandler):
+        """Called by the FileHandler when a clone in its file is refactored. The FileHandler is no longer removed by release."""
+        self.releasable.pop(filehandler, None)
+
+    def remove(self, filepath: str | Path):
+        """Removes the FileHandler of the file at the given path, and its analysis, so that they can be freed."""
+        key = Path(filepath).resolve()
+        filehandler = self.handlers.pop(key, None)
+        if filehandler is not None:
+            self.releasable.pop(filehandler, None)
+            filehandler.analysis.set_pinned(False)
+            ModuleAnalysis.discard(filehandler.filepath)
+
+    def release(self):
+        """Removes the FileHandlers of files without refactored clones, least recently used first, while over the memory budget.
+        To be called once the clone classes which have been built so far are refactored."""
+        while ModuleAnalysis.over_budget() and len(self.releasable) > 0:
+            filehandler, key = self.releasable.popitem(last=False)
+            self.remove(key)
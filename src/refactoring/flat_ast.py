@@ -0,0 +1,91 @@
+import ast
+
+
+class FlatAST():
+    """An AST (e.g. the FunctionDef of a clone) flattened once into preorder arrays,
+    so that the ASTs of the clones in a clone class can be walked in lockstep without recursion.
+
+    For the node on each index:
+        - nodes - the node itself
+        - types - type of the node
+        - keys - the value compared between clones: Constant.value, Name.id or Attribute.attr (None for other nodes)
+        - parents - index of the parent node (-1 for the root)
+        - child_lists - indices of the children of the node, in the same order as given by ast.iter_child_nodes
+        - hashes - hash of the subtree of the node: its type, its other fields (e.g. constant values and identifiers) and the hashes of its children.
+            Subtrees with the same hash have no differences between them.
+        - needs_visit - whether the subtree has a node which is always visited when comparing clones, even without differences:
+            names in a store context and function definitions (local definitions), and calls with keywords (sorted)
+    """
+
+    key_fields = {ast.Constant: "value", ast.Name: "id", ast.Attribute: "attr"}
+
+    def __init__(self, root) -> None:
+        self.nodes = []
+        self.types = []
+        self.keys = []
+        self.parents = []
+        self.child_lists = []
+        self.needs_visit = []
+        fields = [] #the fields of each node which are not nodes (e.g. constant values and identifiers), for hashing
+
+        stack = [(root, -1)]
+        while stack != []:
+            node, parent = stack.pop()
+            index = len(self.nodes)
+            node_type = type(node)
+            self.nodes.append(node)
+            self.types.append(node_type)
+            self.parents.append(parent)
+            self.child_lists.append([])
+            if parent != -1:
+                #children are popped from the stack in order
+                self.child_lists[parent].append(index)
+
+            key_field = FlatAST.key_fields.get(node_type)
+            self.keys.append(None if key_field is None else getattr(node, key_field))
+            self.needs_visit.append(FlatAST.always_visited(node, node_type))
+
+            #same as ast.iter_fields and ast.iter_child_nodes, in one pass
+            children = []
+            node_fields = []
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, ast.AST):
+                    children.append(value)
+                elif type(value) is list:
+                    #children are hashed separately, their positions among other values (e.g. None in Dict.keys) are kept here
+                    node_fields.append(repr([ast.AST if isinstance(item, ast.AST) else item for item in value]))
+                    children.extend(item for item in value if isinstance(item, ast.AST))
+                else:
+                    #repr, so that values which are equal but of different types (1 and True) are not hashed the same
+                    node_fields.append(repr(value))
+            fields.append(tuple(node_fields))
+            for child in reversed(children):
+                stack.append((child, index))
+
+        #children come after their parent, so going backwards every child is hashed before its parent
+        self.hashes = [None] * len(self.nodes)
+        for index in range(len(self.nodes) - 1, -1, -1):
+            self.hashes[index] = hash((self.types[index], fields[index], tuple([self.hashes[child] for child in self.child_lists[index]])))
+            if self.needs_visit[index] and self.parents[index] != -1:
+                self.needs_visit[self.parents[index]] = True
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def always_visited(node, node_type) -> bool:
+        if node_type is ast.Name:
+            return type(node.ctx) == ast.Store
+        elif node_type is ast.Call:
+            return node.keywords != []
+        return node_type is ast.FunctionDef or node_type is ast.AsyncFunctionDef
+
+    def children(self, index: int) -> list:
+        """Returns the indices of the children of the node on the given index."""
+        return self.child_lists[index]
+
+    def reordered_children(self, index: int) -> list:
+        """Returns the indices of the children of the node on the given index,
+        in the order ast.iter_child_nodes gives them now (e.g. after the keywords of a Call are sorted)."""
+        child_index = {id(self.nodes[child]): child for child in self.children(index)}
+        return [child_index[id(child)] for child in ast.iter_child_nodes(self.nodes[index])]
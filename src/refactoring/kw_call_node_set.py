@@ -56,5 +56,5 @@ class KwCallNodeSet():
         groups nodes into split groups. Nodes with the same keywords go in the same group."""
         self.split_groups = {}
         for ind in range(len(node_kw_sets)):
-            self.split_groups.setdefault(str(node_kw_sets[ind]), []).append(ind)
+            self.split_groups.setdefault(frozenset(node_kw_sets[ind]), []).append(ind)
         
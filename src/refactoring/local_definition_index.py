@@ -0,0 +1,50 @@
+class LocalDefinitionIndex():
+    """Keeps the local definitions of a clone class (NameNodeDifference objects, one identifier per clone) in the order they are added,
+    each with the line number of its latest definition.
+
+    Indexed on the tuple of identifiers, and on each (clone index, identifier),
+    so that the consistency of a NameNodeDifference with the definitions is found with a few lookups,
+    rather than by calling NameNodeDifference.check_consistency on every definition."""
+
+    def __init__(self):
+        self.linenos = {} #tuple of identifiers -> line number of definition, in order added
+        self.order = [] #tuple of identifiers of each definition, in order added
+        self.first_definitions = {} #(clone index, identifier) -> position in self.order of the first definition with that identifier on that index
+
+    def __contains__(self, name_difference):
+        return name_difference.get_identifiers() in self.linenos
+
+    def __getitem__(self, name_difference):
+        return self.linenos[name_difference.get_identifiers()]
+
+    def __setitem__(self, name_difference, lineno):
+        """Sets the line number of the definition of the given NameNodeDifference, adding it to the index if not already there."""
+        identifiers = name_difference.get_identifiers()
+        if identifiers not in self.linenos:
+            for index in range(len(identifiers)):
+                self.first_definitions.setdefault((index, identifiers[index]), len(self.order))
+            self.order.append(identifiers)
+        self.linenos[identifiers] = lineno
+
+    def check_consistency(self, name_difference):
+        """Checks the consistency of the given NameNodeDifference with the first definition (in order added)
+        with which it shares an identifier on an index. Same result as looping over the definitions, calling check_consistency on each,
+        and stopping at the first which is not 'different'.
+
+        Returns:
+            - 'consistent' if that definition has the same identifiers
+            - 'inconsistent' if it only has some of the same identifiers
+            - 'different' if no definition shares an identifier on an index with name_difference
+        """
+        identifiers = name_difference.get_identifiers()
+        first = None
+        for index in range(len(identifiers)):
+            position = self.first_definitions.get((index, identifiers[index]))
+            if position is not None and (first is None or position < first):
+                first = position
+
+        if first is None:
+            return "different"
+        elif self.order[first] == identifiers:
+            return "consistent"
+        return "inconsistent"
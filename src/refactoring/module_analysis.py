@@ -0,0 +1,235 @@
+import io
+import ast
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ModuleAnalysis:
+    """The contents and analysis of a single python file: its text, lines, AST and the names local to the module scope.
+    The file is read once, and the AST and module scope are computed on first use,
+    so that ASTParser, FileHandler and test counting do not each read and parse the file again.
+
+    Analyses are shared through ModuleAnalysis.get, keyed on the file's device and inode,
+    so a hardlink to a file (e.g. in the tmp filestructure) shares the analysis of the original.
+
+    If ModuleAnalysis.memory_budget is set, the least recently used analyses are removed once their estimated memory use exceeds the budget.
+    Analyses of files with a FileHandler are pinned, and never removed (see FileHandlerRegistry). Removed analyses are read again on demand.
+    """
+    analyses = {} #(st_dev, st_ino) -> ModuleAnalysis
+    unpinned = OrderedDict() #(st_dev, st_ino) -> None, of the analyses which are not pinned, least recently used first
+    memory_budget = None #bytes
+    memory_used = 0 #estimated bytes used by the analyses
+    size_factor = 32 #estimated bytes of memory per character of the file, for the text, lines and AST
+
+    def __init__(self, filepath: Path, stat_key = None, text: str = None, ast_base = None) -> None:
+        """Parameters:
+            - filepath - path of the file
+            - stat_key - (st_mtime_ns, st_size) of the file when read, to notice changes to the file
+            - text, ast_base - contents and AST of the file, if already read and parsed (see ModuleAnalysis.preload). Otherwise the file is read here.
+        """
+        self.filepath = filepath
+        self.stat_key = stat_key
+        if text is None:
+            try:
+                with open(filepath) as f:
+                    text = f.read()
+            except (UnicodeDecodeError, OSError):
+                #unreadable file, treated as an unparseable one (as parse_file_to_AST did)
+                text = ""
+                ast_base = False
+        self.text = text
+        self._lines = None
+        self._ast_base = ast_base
+        self._module_locals = None
+        self.key = None #(st_dev, st_ino), once added
+        self.pinned = False
+
+    def get(path: str | Path):
+        """Returns the analysis of the file at the given path. The file is only read again if it has changed since last read.
+
+        Parameters:
+            - path - path to relevant file. str or pathlib.Path
+
+        Returns:
+            ModuleAnalysis of the file.
+        """
+        path = Path(path)
+        if not path.exists():
+            raise ValueError("File does not exist: " + str(path))
+        elif not path.is_file():
+            raise IsADirectoryError("Given path points to a directory: " + str(path))
+
+        stat = path.stat()
+        key = (stat.st_dev, stat.st_ino)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        analysis = ModuleAnalysis.analyses.get(key)
+        if analysis is None or analysis.stat_key != stat_key:
+            analysis = ModuleAnalysis(path, stat_key)
+            ModuleAnalysis.add(key, analysis)
+        elif not analysis.pinned:
+            ModuleAnalysis.unpinned.move_to_end(key)
+        return analysis
+
+    def add(key, analysis):
+        """Adds the analysis under the given key, replacing any previous analysis, and removes analyses if over the memory budget."""
+        ModuleAnalysis.remove(key)
+        analysis.key = key
+        ModuleAnalysis.analyses[key] = analysis
+        if not analysis.pinned:
+            ModuleAnalysis.unpinned[key] = None
+        ModuleAnalysis.memory_used += analysis.memory_size
+        ModuleAnalysis.evict(keep=key)
+
+    def remove(key):
+        analysis = ModuleAnalysis.analyses.pop(key, None)
+        ModuleAnalysis.unpinned.pop(key, None)
+        if analysis is not None:
+            ModuleAnalysis.memory_used -= analysis.memory_size
+
+    def discard(path: str | Path):
+        """Removes the analysis of the file at the given path, if any (and not pinned)."""
+        path = Path(path)
+        if not path.is_file():
+            return
+        stat = path.stat()
+        key = (stat.st_dev, stat.st_ino)
+        analysis = ModuleAnalysis.analyses.get(key)
+        if analysis is not None and not analysis.pinned:
+            ModuleAnalysis.remove(key)
+
+    def evict(keep = None):
+        """Removes the least recently used analyses which are not pinned, until the estimated memory use is within the memory budget.
+        The analysis with the key keep (the one just added) is not removed, as it is about to be used."""
+        while ModuleAnalysis.over_budget() and len(ModuleAnalysis.unpinned) > 0:
+            key = next(iter(ModuleAnalysis.unpinned))
+            if key == keep:
+                #least recently used is the one just added, the rest are pinned
+                break
+            ModuleAnalysis.remove(key)
+
+    def set_pinned(self, pinned: bool):
+        """Pins the analysis (it is never removed), or unpins it (it may be removed, once it is the least recently used)."""
+        self.pinned = pinned
+        if self.key is None or ModuleAnalysis.analyses.get(self.key) is not self:
+            return
+        if pinned:
+            ModuleAnalysis.unpinned.pop(self.key, None)
+        else:
+            ModuleAnalysis.unpinned[self.key] = None
+
+    def over_budget() -> bool:
+        """Returns True if the estimated memory use of the analyses is over the memory budget."""
+        return ModuleAnalysis.memory_budget is not None and ModuleAnalysis.memory_used > ModuleAnalysis.memory_budget
+
+    def preload(paths, jobs: int):
+        """Reads and parses the files at the given paths concurrently in a pool of worker processes,
+        so that their analyses are ready before the clone classes are built. Files which are already analysed are skipped.
+
+        Parameters:
+            - paths - iterable of paths to python files
+            - jobs - number of worker processes
+        """
+        paths = [Path(path) for path in paths]
+        paths = [path for path in paths if not ModuleAnalysis.is_loaded(path)]
+        if paths == []:
+            return
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            #several files per task, as parsing a single file is quick compared to sending it between processes
+            chunksize = max(1, len(paths) // (jobs * 4))
+            for path, key, stat_key, text, ast_base in pool.map(ModuleAnalysis.read_and_parse, paths, chunksize=chunksize):
+                if key is None:
+                    #can not be stat'ed, left to ModuleAnalysis.get
+                    continue
+                ModuleAnalysis.add(key, ModuleAnalysis(path, stat_key, text, ast_base))
+
+    def read_and_parse(path: Path):
+        """Worker function for ModuleAnalysis.preload. Returns the path, the keys from stat, the text and the AST (False if unparseable) of the file.
+        A file which can not be read or decoded gets empty text and an AST of False, rather than failing the whole pool.
+        The keys are None if the file can not be stat'ed."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return path, None, None, "", False
+        analysis = ModuleAnalysis(path)
+        return path, (stat.st_dev, stat.st_ino), (stat.st_mtime_ns, stat.st_size), analysis.text, analysis.ast_base
+
+    def is_loaded(path: Path) -> bool:
+        """Returns True if there is an up to date analysis of the file at the given path."""
+        if not path.is_file():
+            return False
+        stat = path.stat()
+        analysis = ModuleAnalysis.analyses.get((stat.st_dev, stat.st_ino))
+        return analysis is not None and analysis.stat_key == (stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def memory_size(self) -> int:
+        """Estimated number of bytes of memory used by the analysis."""
+        return len(self.text) * ModuleAnalysis.size_factor
+
+    @property
+    def lines(self) -> list:
+        """Lines of the file, as returned by readlines. Not to be changed, copy the list first."""
+        if self._lines is None:
+            self._lines = io.StringIO(self.text).readlines()
+        return self._lines
+
+    @property
+    def ast_base(self):
+        """Base of the AST of the file, or False if the file can not be parsed (same as ASTParser.parse_file_to_AST)."""
+        if self._ast_base is None:
+            try:
+                self._ast_base = ast.parse(self.text)
+            except:
+                self._ast_base = False
+        return self._ast_base
+
+    @property
+    def module_locals(self) -> frozenset:
+        """Names bound in the module scope of the file (same as the symbols which are local in the top-level symbol table of the 'symtable' module).
+        Found from the AST, so the file is not compiled again."""
+        if self._module_locals is None:
+            names = set()
+            if self.ast_base:
+                ModuleAnalysis.add_bound_names(self.ast_base, names)
+            self._module_locals = frozenset(names)
+        return self._module_locals
+
+    def add_bound_names(node, names: set):
+        """Adds the names bound by the given node and its descendants in the current scope to names.
+        Bodies of functions, classes and lambdas are their own scopes, and are not visited, nor are comprehensions."""
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Load):
+                names.add(node.id)
+            return
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            #decorators, default values, annotations and base classes are evaluated in the current scope
+            if isinstance(node, ast.ClassDef):
+                children = node.decorator_list + node.bases + node.keywords
+            else:
+                children = node.decorator_list + [node.args, node.returns]
+            for child in children:
+                if child is not None:
+                    ModuleAnalysis.add_bound_names(child, names)
+            return
+        elif isinstance(node, ast.Lambda):
+            ModuleAnalysis.add_bound_names(node.args, names)
+            return
+        elif isinstance(node, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            return
+
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.asname is not None:
+                    names.add(alias.asname)
+                elif alias.name != "*":
+                    names.add(alias.name.split(".")[0])
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and node.name is not None:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest is not None:
+            names.add(node.rest)
+
+        for child in ast.iter_child_nodes(node):
+            ModuleAnalysis.add_bound_names(child, names)
@@ -16,6 +16,10 @@ class NameNodeDifference(NodeDifference):
         return name == self.nodes[index].id
 
 
+    def get_identifiers(self) -> tuple:
+        """Returns the identifiers of the nodes, one per clone."""
+        return tuple(node.id for node in self.nodes)
+
     def replace_nodes(self, parametrized_name):
         replace_node = ast.Name(parametrized_name)
         CloneASTUtilities.replace_node(self.nodes[0], self.parent_nodes[0], replace_node)
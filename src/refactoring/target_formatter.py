@@ -37,6 +37,9 @@ class TargetFormatter():
             #NOTE: could add more formatters here if needed.
         if self.ast_node.col_offset != 0:
             formatted = formatted.replace(class_prepend, '', 1)
+            if self.ast_node.col_offset != 4:
+                #black indents the body of class A by 4, method of a nested class needs its own indent level back
+                formatted = "".join((" " * self.ast_node.col_offset) + line[4:] if line.startswith("    ") else line for line in formatted.splitlines(keepends=True))
 
         return formatted
 
@@ -0,0 +1,96 @@
+import ast
+import glob
+import os
+from flat_ast import FlatAST
+
+
+def preorder(node, parent_index, nodes, parents):
+    """Reference preorder, recursive over ast.iter_child_nodes."""
+    index = len(nodes)
+    nodes.append(node)
+    parents.append(parent_index)
+    for child in ast.iter_child_nodes(node):
+        preorder(child, index, nodes, parents)
+
+
+def source_files():
+    return sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py")))
+
+
+def test_preorder():
+    for filepath in source_files():
+        with open(filepath) as f:
+            root = ast.parse(f.read())
+        flat = FlatAST(root)
+        nodes, parents = [], []
+        preorder(root, -1, nodes, parents)
+
+        assert [id(node) for node in flat.nodes] == [id(node) for node in nodes]
+        assert flat.parents == parents
+        for index in range(len(flat)):
+            assert [flat.nodes[child] for child in flat.children(index)] == list(ast.iter_child_nodes(flat.nodes[index]))
+
+
+def test_equal_hashes_are_equal_subtrees():
+    #every pair of subtrees with the same hash is the same code (ast.dump without line numbers)
+    for filepath in source_files():
+        with open(filepath) as f:
+            flat = FlatAST(ast.parse(f.read()))
+        dumps = {}
+        for index in range(len(flat)):
+            dump = ast.dump(flat.nodes[index])
+            assert dumps.setdefault(flat.hashes[index], dump) == dump
+
+
+def test_hash_ignores_position():
+    flat = FlatAST(ast.parse("def f():\n    x = g(1, 'a')\n\n\n\ndef h():\n    pass\n    x = g(1, \"a\")"))
+    assigns = [index for index in range(len(flat)) if flat.types[index] is ast.Assign]
+    assert len(assigns) == 2
+    assert flat.hashes[assigns[0]] == flat.hashes[assigns[1]]
+
+
+def test_hash_differs_on_values():
+    def call_hash(source):
+        flat = FlatAST(ast.parse(source))
+        return flat.hashes[flat.types.index(ast.Call)]
+
+    assert call_hash("f(1)") != call_hash("f(2)")
+    assert call_hash("f(1)") != call_hash("f(True)")
+    assert call_hash("f(1)") != call_hash("f(1.0)")
+    assert call_hash("f(a)") != call_hash("f(b)")
+    assert call_hash("f(a.b)") != call_hash("f(a.c)")
+    assert call_hash("f({None: 1, 2: 3})") != call_hash("f({**x, 2: 3})")
+
+
+def test_keys():
+    flat = FlatAST(ast.parse("a.b(1)"))
+    keys = {flat.types[index]: flat.keys[index] for index in range(len(flat))}
+    assert keys[ast.Name] == "a"
+    assert keys[ast.Attribute] == "b"
+    assert keys[ast.Constant] == 1
+    assert keys[ast.Call] is None
+
+
+def test_needs_visit():
+    def visits(source):
+        flat = FlatAST(ast.parse(source).body[0])
+        return flat.needs_visit[0]
+
+    assert not visits("assert f(x) == 1")
+    assert visits("x = 1")
+    assert visits("assert f(x, key=1) == 1")
+    assert visits("if a:\n    def g():\n        pass")
+    assert visits("for i in range(3):\n    pass")
+
+
+def test_reordered_children():
+    flat = FlatAST(ast.parse("f(b=1, a=2)"))
+    call = flat.types.index(ast.Call)
+    call_node = flat.nodes[call]
+    before = flat.children(call)
+    call_node.keywords = [call_node.keywords[1], call_node.keywords[0]]
+
+    after = flat.reordered_children(call)
+    assert [flat.nodes[child] for child in after] == list(ast.iter_child_nodes(call_node))
+    assert sorted(after) == sorted(before)
+    assert after != before
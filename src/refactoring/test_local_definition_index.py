@@ -0,0 +1,89 @@
+import random
+from local_definition_index import LocalDefinitionIndex
+
+
+class Name:
+    def __init__(self, id):
+        self.id = id
+
+
+class Difference:
+    """Stand-in for NameNodeDifference: one name node per clone."""
+    def __init__(self, ids):
+        self.nodes = [Name(id) for id in ids]
+
+    def get_identifiers(self):
+        return tuple(node.id for node in self.nodes)
+
+
+def check_consistency(local_def, other):
+    """Same as NameNodeDifference.check_consistency."""
+    diffs = 0
+    for index in range(len(local_def.nodes)):
+        if local_def.nodes[index].id != other.nodes[index].id:
+            diffs += 1
+    if diffs == len(local_def.nodes):
+        return "different"
+    elif diffs == 0:
+        return "consistent"
+    return "inconsistent"
+
+
+def check_all(local_defs, name_difference):
+    """The loop find_local_variables used before LocalDefinitionIndex: first definition which is not 'different'."""
+    for local_def in local_defs:
+        consistency = check_consistency(local_def, name_difference)
+        if consistency != "different":
+            return consistency
+    return "different"
+
+
+def test_check_consistency():
+    index = LocalDefinitionIndex()
+    index[Difference(["a", "b"])] = 3
+    index[Difference(["c", "d"])] = 5
+
+    assert index.check_consistency(Difference(["a", "b"])) == "consistent"
+    assert index.check_consistency(Difference(["c", "d"])) == "consistent"
+    assert index.check_consistency(Difference(["a", "d"])) == "inconsistent"
+    assert index.check_consistency(Difference(["b", "a"])) == "different"
+    assert index.check_consistency(Difference(["x", "y"])) == "different"
+
+
+def test_first_definition_decides():
+    index = LocalDefinitionIndex()
+    index[Difference(["a", "x"])] = 1
+    index[Difference(["a", "b"])] = 2
+    #the first definition sharing an identifier is ("a", "x"), so not consistent even though ("a", "b") is a definition
+    assert index.check_consistency(Difference(["a", "b"])) == "inconsistent"
+
+
+def test_linenos():
+    index = LocalDefinitionIndex()
+    index[Difference(["a", "b"])] = 3
+    assert Difference(["a", "b"]) in index
+    assert Difference(["a", "c"]) not in index
+    assert index[Difference(["a", "b"])] == 3
+
+    index[Difference(["a", "b"])] = float('inf')
+    assert index[Difference(["a", "b"])] == float('inf')
+    assert index.order == [("a", "b")]
+
+
+def test_same_as_loop():
+    rng = random.Random(1)
+    for trial in range(20000):
+        n_clones = rng.randint(2, 4)
+        def new_difference():
+            return Difference([rng.choice("abcd") for _ in range(n_clones)])
+
+        local_defs = []
+        index = LocalDefinitionIndex()
+        for _ in range(rng.randint(0, 6)):
+            local_def = new_difference()
+            if local_def.get_identifiers() not in [other.get_identifiers() for other in local_defs]:
+                local_defs.append(local_def)
+            index[local_def] = 1
+
+        name_difference = new_difference()
+        assert index.check_consistency(name_difference) == check_all(local_defs, name_difference)
@@ -0,0 +1,43 @@
+from module_analysis import ModuleAnalysis
+
+
+def test_parses_file(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("import os\nx = 1\n\ndef f():\n    pass\n")
+    analysis = ModuleAnalysis(path)
+    assert analysis.lines[1] == "x = 1\n"
+    assert analysis.ast_base
+    assert analysis.module_locals >= {"os", "x", "f"}
+
+
+def test_latin1_file_is_unparseable(tmp_path):
+    path = tmp_path / "latin1.py"
+    path.write_bytes("x = 'café'\n".encode("latin-1"))
+    analysis = ModuleAnalysis(path)
+    assert analysis.text == ""
+    assert analysis.ast_base is False
+
+
+def test_read_and_parse_unreadable_files(tmp_path):
+    path = tmp_path / "latin1.py"
+    path.write_bytes("x = 'café'\n".encode("latin-1"))
+    _, key, stat_key, text, ast_base = ModuleAnalysis.read_and_parse(path)
+    assert key is not None and stat_key is not None
+    assert (text, ast_base) == ("", False)
+
+    _, key, stat_key, text, ast_base = ModuleAnalysis.read_and_parse(tmp_path / "missing.py")
+    assert (key, stat_key, text, ast_base) == (None, None, "", False)
+
+
+def test_preload_with_unreadable_file(tmp_path):
+    good = tmp_path / "good.py"
+    good.write_text("x = 1\n")
+    bad = tmp_path / "latin1.py"
+    bad.write_bytes("x = 'café'\n".encode("latin-1"))
+    try:
+        ModuleAnalysis.preload([good, bad, tmp_path / "missing.py"], 2)
+        assert ModuleAnalysis.get(good).ast_base
+        assert ModuleAnalysis.get(bad).ast_base is False
+    finally:
+        ModuleAnalysis.discard(good)
+        ModuleAnalysis.discard(bad)